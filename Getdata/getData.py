@@ -1,213 +1,344 @@
 import json
 import argparse
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, NamedTuple
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from Setup.apiSetup import KalshiAPI
 
 # Get project root directory
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 
+# Prices are in cents (0-100). int16 rather than int8 so bid + ask sums can't overflow.
+PRICE_DTYPE = np.int16
+
+# Market fields copied from the API for every market
+MARKET_FIELDS = ("ticker", "title", "status", "close_time", "open_time", "yes_bid", "yes_ask",
+                 "no_bid", "no_ask", "volume", "volume_24h", "last_price")
+
+# Market fields that are only included in the output when non-empty
+OPTIONAL_MARKET_FIELDS = ("event_ticker", "subtitle", "series_ticker")
+
 def setup_client():
     """Setup and return a Kalshi client using apiSetup."""
+    # Imported here so the SDK is only loaded when a client is actually needed (e.g. not for --help)
+    from Setup.apiSetup import KalshiAPI
     api = KalshiAPI()
     return api.get_client()
 
-def get_markets(client, limit: Optional[int] = None, status: Optional[str] = None, max_markets: Optional[int] = None) -> List[Dict[str, Any]]:
-    """Get markets from Kalshi API with pagination support.
+def _market_to_dict(market) -> Dict[str, Any]:
+    """Convert an SDK market object to a plain dictionary."""
+    market_dict = {
+        "ticker": market.ticker,
+        "title": market.title,
+        "status": market.status,
+        "close_time": market.close_time,
+        "open_time": market.open_time,
+        "yes_bid": market.yes_bid,
+        "yes_ask": market.yes_ask,
+        "no_bid": market.no_bid,
+        "no_ask": market.no_ask,
+        "volume": market.volume,
+        "volume_24h": market.volume_24h,
+        "last_price": market.last_price
+    }
     
-    Note: status parameter is ignored due to SDK validation issues.
-    All markets are fetched and can be filtered client-side.
-    """
+    # Add optional fields if they are not empty (SDK models always define them,
+    # so read them directly and only fall back to getattr for other objects)
     try:
-        all_markets = []
-        cursor = None
-        batch_size = 1000  # Maximum per request
-        
-        print(f"Fetching markets from Kalshi...")
+        optional_values = (market.event_ticker, market.subtitle, market.series_ticker)
+    except AttributeError:
+        optional_values = tuple(getattr(market, name, '') for name in OPTIONAL_MARKET_FIELDS)
+    for name, value in zip(OPTIONAL_MARKET_FIELDS, optional_values):
+        if value:
+            market_dict[name] = value
+    return market_dict
+
+def _raw_market_to_dict(market: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields we use from a raw /markets JSON market."""
+    market_dict = {name: market.get(name) for name in MARKET_FIELDS}
+    for name in OPTIONAL_MARKET_FIELDS:
+        value = market.get(name)
+        if value:
+            market_dict[name] = value
+    return market_dict
+
+def _fetch_markets_page(session: requests.Session, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """GET one page of the public /markets endpoint and return the parsed JSON."""
+    response = session.get(url, params=params, timeout=30)
+    response.raise_for_status()
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+def iter_market_pages(client, limit: Optional[int] = None, max_markets: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield markets from Kalshi API one page at a time.
+    
+    Only the current page is held in memory, so callers can process or write
+    markets as they arrive. The request for the next page is issued on a
+    background thread as soon as its cursor is known, so it overlaps with
+    converting and consuming the current page. Errors are raised to the caller.
+    
+    Pages are fetched straight from the REST endpoint rather than through the SDK, which
+    would validate and build a model object for every market only for us to copy it back
+    into a dict (and fails validation on some market statuses).
+    """
+    batch_size = 1000  # Maximum per request
+    page_size = min(batch_size, limit) if limit else batch_size
+    cap = min(x for x in (limit, max_markets) if x) if (limit or max_markets) else None
+    fetched = 0
+    
+    print(f"Fetching markets from Kalshi...")
+    
+    url = f"{client.api_client.configuration.host}/markets"
+    
+    # Persistent session so the TCP/TLS connection is reused between pages
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=1) as executor:
+        session.headers.update({'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+        future = executor.submit(_fetch_markets_page, session, url, {"limit": page_size})
         
         while True:
-            # Prepare parameters - don't pass status due to SDK enum validation issues
-            params = {
-                "limit": min(batch_size, limit) if limit else batch_size
-            }
+            response = future.result()
+            raw_markets = response.get("markets")
             
-            if cursor:
-                params["cursor"] = cursor
-            
-            # Get markets batch
-            response = client.get_markets(**params)
-            
-            if not response.markets:
+            if not raw_markets:
                 break
             
-            # Convert market objects to dictionaries
-            for market in response.markets:
-                market_dict = {
-                    "ticker": market.ticker,
-                    "title": market.title,
-                    "status": market.status,
-                    "close_time": market.close_time,
-                    "open_time": market.open_time,
-                    "yes_bid": market.yes_bid,
-                    "yes_ask": market.yes_ask,
-                    "no_bid": market.no_bid,
-                    "no_ask": market.no_ask,
-                    "volume": market.volume,
-                    "volume_24h": market.volume_24h,
-                    "last_price": market.last_price
-                }
-                
-                # Add optional fields if they exist and are not empty
-                event_ticker = getattr(market, 'event_ticker', '')
-                if event_ticker:
-                    market_dict["event_ticker"] = event_ticker
-                    
-                subtitle = getattr(market, 'subtitle', '')
-                if subtitle:
-                    market_dict["subtitle"] = subtitle
-                    
-                series_ticker = getattr(market, 'series_ticker', '')
-                if series_ticker:
-                    market_dict["series_ticker"] = series_ticker
-                all_markets.append(market_dict)
+            # Kick off the next page request before doing any work on this one
+            cursor = response.get("cursor")
+            has_more = bool(cursor) and (cap is None or fetched + len(raw_markets) < cap)
+            if has_more:
+                future = executor.submit(_fetch_markets_page, session, url, {"limit": page_size, "cursor": cursor})
             
-            print(f"Fetched {len(all_markets)} markets so far...")
+            # Keep only the fields we use
+            page = [_raw_market_to_dict(market) for market in raw_markets]
             
-            # Check if we have a cursor for next page
-            if hasattr(response, 'cursor') and response.cursor:
-                cursor = response.cursor
-            else:
-                break
+            # Trim to the desired limit / max_markets limit
+            if cap is not None and fetched + len(page) > cap:
+                page = page[:cap - fetched]
             
-            # Check if we've reached the desired limit
-            if limit and len(all_markets) >= limit:
-                all_markets = all_markets[:limit]
-                break
+            fetched += len(page)
+            print(f"Fetched {fetched} markets so far...")
+            yield page
             
-            # Check if we've reached the max_markets limit
-            if max_markets and len(all_markets) >= max_markets:
-                all_markets = all_markets[:max_markets]
+            if not has_more:
                 break
-        
-        print(f"Total markets fetched: {len(all_markets)}")
-        return all_markets
-        
+    
+    print(f"Total markets fetched: {fetched}")
+
+def get_markets(client, limit: Optional[int] = None, status: Optional[str] = None, max_markets: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get markets from Kalshi API with pagination support.
+    
+    Note: status parameter is ignored (it used to trip SDK validation issues).
+    All markets are fetched and can be filtered client-side.
+    """
+    try:
+        return [market for page in iter_market_pages(client, limit=limit, max_markets=max_markets) for market in page]
     except Exception as e:
         print(f"Error fetching markets: {e}")
         return []
 
-def calculate_spread(market: Dict[str, Any]) -> Dict[str, float]:
-    """Calculate the spread for a market using bid/ask prices."""
-    try:
-        # Get bid and ask prices (in cents)
-        yes_bid = market.get("yes_bid", 0)
-        yes_ask = market.get("yes_ask", 0)
-        no_bid = market.get("no_bid", 0)
-        no_ask = market.get("no_ask", 0)
-        
-        # Calculate spreads for both yes and no contracts
-        yes_spread = yes_ask - yes_bid if yes_ask and yes_bid else 0
-        no_spread = no_ask - no_bid if no_ask and no_bid else 0
-        
-        # Use the larger spread as the market spread
-        absolute_spread = max(yes_spread, no_spread)
-        
-        # Calculate percentage spread based on the contract with the larger spread
-        if yes_spread >= no_spread and yes_bid and yes_ask:
-            mid_price = (yes_bid + yes_ask) / 2
-            percentage_spread = (yes_spread / mid_price * 100) if mid_price > 0 else 0
-        elif no_bid and no_ask:
-            mid_price = (no_bid + no_ask) / 2
-            percentage_spread = (no_spread / mid_price * 100) if mid_price > 0 else 0
-        else:
-            percentage_spread = 0
-        
-        return {
-            "absolute_spread": absolute_spread,
-            "percentage_spread": percentage_spread,
-            "yes_bid": yes_bid,
-            "yes_ask": yes_ask,
-            "no_bid": no_bid,
-            "no_ask": no_ask,
-            "yes_spread": yes_spread,
-            "no_spread": no_spread
-        }
-    except Exception as e:
-        print(f"Error calculating spread for market {market.get('ticker', 'unknown')}: {e}")
-        return {
-            "absolute_spread": 0,
-            "percentage_spread": 0,
-            "yes_bid": 0,
-            "yes_ask": 0,
-            "no_bid": 0,
-            "no_ask": 0,
-            "yes_spread": 0,
-            "no_spread": 0
-        }
+def load_tickers(path: str) -> List[str]:
+    """Load market tickers from a file (one per line, blank lines and # comments ignored)."""
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
 
-def sort_markets_by_spread(markets: List[Dict[str, Any]], sort_by: str = "percentage") -> List[Dict[str, Any]]:
-    """Sort markets by spread (highest first)."""
-    markets_with_spread = []
+def get_markets_by_ticker(client, tickers: List[str]) -> List[Dict[str, Any]]:
+    """Get specific markets by ticker using a single client.
     
-    for market in markets:
-        spread_data = calculate_spread(market)
+    Markets that fail to load are skipped so one bad ticker doesn't stop the batch.
+    """
+    markets = []
+    for ticker in tickers:
+        try:
+            response = client.get_market(ticker)
+            market = getattr(response, 'market', None) or response
+            markets.append(_market_to_dict(market))
+        except Exception as e:
+            print(f"Error fetching market {ticker}: {e}")
+    print(f"Fetched {len(markets)} of {len(tickers)} requested markets")
+    return markets
+
+class Spread(NamedTuple):
+    """Spread fields for a market (or, from _spreads_vectorized, one array per field)."""
+    yes_bid: Any
+    yes_ask: Any
+    no_bid: Any
+    no_ask: Any
+    yes_spread: Any
+    no_spread: Any
+    absolute_spread: Any
+    percentage_spread: Any
+
+if njit is not None:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _spread_kernel(yb, ya, nb, na, yes_out, no_out, abs_out, pct_out):
+        """
+        Fused per-market spread loop. A side's spread is ask - bid when both are quoted (0 otherwise);
+        the absolute spread is the larger of the two, and the percentage spread is that side's spread
+        over its mid price (the yes side on ties, 0 without a quoted side).
+        """
+        for i in prange(yb.shape[0]):
+            has_yes = yb[i] > 0 and ya[i] > 0
+            has_no = nb[i] > 0 and na[i] > 0
+            ys = ya[i] - yb[i] if has_yes else 0
+            ns = na[i] - nb[i] if has_no else 0
+            yes_out[i] = ys
+            no_out[i] = ns
+            abs_out[i] = ys if ys > ns else ns
+            if ys >= ns and has_yes:
+                mid = (yb[i] + ya[i]) * 0.5
+                side = ys
+            elif has_no:
+                mid = (nb[i] + na[i]) * 0.5
+                side = ns
+            else:
+                mid = 0.0
+                side = 0
+            pct_out[i] = side / mid * 100.0 if mid > 0 else 0.0
+else:
+    _spread_kernel = None
+
+def _spreads_vectorized(markets: List[Dict[str, Any]]) -> Spread:
+    """Compute spread columns for all markets at once (one array per field)."""
+    n = len(markets)
+    yb = np.fromiter((m.get("yes_bid", 0) or 0 for m in markets), dtype=PRICE_DTYPE, count=n)
+    ya = np.fromiter((m.get("yes_ask", 0) or 0 for m in markets), dtype=PRICE_DTYPE, count=n)
+    nb = np.fromiter((m.get("no_bid", 0) or 0 for m in markets), dtype=PRICE_DTYPE, count=n)
+    na = np.fromiter((m.get("no_ask", 0) or 0 for m in markets), dtype=PRICE_DTYPE, count=n)
+    
+    if _spread_kernel is not None:
+        yes_spread = np.empty(n, dtype=PRICE_DTYPE)
+        no_spread = np.empty(n, dtype=PRICE_DTYPE)
+        absolute_spread = np.empty(n, dtype=PRICE_DTYPE)
+        percentage_spread = np.empty(n, dtype=np.float64)
+        _spread_kernel(yb, ya, nb, na, yes_spread, no_spread, absolute_spread, percentage_spread)
+    else:
+        # A side only has a spread when both of its prices are quoted
+        has_yes = (yb > 0) & (ya > 0)
+        has_no = (nb > 0) & (na > 0)
+        yes_spread = np.where(has_yes, ya - yb, 0)
+        no_spread = np.where(has_no, na - nb, 0)
+        absolute_spread = np.maximum(yes_spread, no_spread)
         
-        # Add spread information to market data
-        market_with_spread = {
-            **market,
-            "spread_data": spread_data
-        }
-        markets_with_spread.append(market_with_spread)
+        # Percentage spread is based on the contract with the larger spread
+        use_yes = (yes_spread >= no_spread) & has_yes
+        mid_price = np.where(use_yes, (yb + ya) * 0.5, (nb + na) * 0.5)
+        side_spread = np.where(use_yes, yes_spread, no_spread)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percentage_spread = np.where(mid_price > 0, side_spread / mid_price * 100.0, 0.0)
     
+    return Spread(yb, ya, nb, na, yes_spread, no_spread, absolute_spread, percentage_spread)
+
+def rank_by_spread(spreads: Spread, sort_by: str = "percentage", top: Optional[int] = None) -> np.ndarray:
+    """Return market indices ordered by spread (highest first).
+    
+    If top is given, only the top N indices are selected (partial sort) and returned.
+    """
     # Sort by specified spread type (default: percentage)
-    if sort_by == "percentage":
-        markets_with_spread.sort(key=lambda x: x["spread_data"]["percentage_spread"], reverse=True)
-    else:  # absolute
-        markets_with_spread.sort(key=lambda x: x["spread_data"]["absolute_spread"], reverse=True)
+    key = spreads.percentage_spread if sort_by == "percentage" else spreads.absolute_spread
+    if top is not None and top < len(key):
+        # Select the top N in O(N): everything above the N-th largest key, then the earliest ties at it,
+        # so the result is the head of the stable full sort (original order breaks ties)
+        kth = np.partition(key, len(key) - top)[len(key) - top]
+        selected = key > kth
+        ties = np.flatnonzero(key == kth)[:top - np.count_nonzero(selected)]
+        selected[ties] = True
+        order = np.flatnonzero(selected)
+        return order[np.argsort(-key[order], kind="stable")]
+    return np.argsort(-key, kind="stable")
+
+def sort_markets_by_spread(markets: List[Dict[str, Any]], sort_by: str = "percentage",
+                           top: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Spread]:
+    """Sort markets by spread (highest first).
     
-    return markets_with_spread
+    If top is given, only the top N markets are selected (partial sort) and returned.
+    Returns the sorted markets together with their spread columns, reordered to match.
+    """
+    spreads = _spreads_vectorized(markets)
+    order = rank_by_spread(spreads, sort_by, top)
+    
+    sorted_markets = [markets[i] for i in order.tolist()]
+    sorted_spreads = Spread._make(column[order] for column in spreads)
+    return sorted_markets, sorted_spreads
+
+def select_top_markets(pages: Iterable[List[Dict[str, Any]]], sort_by: str = "percentage",
+                       top: int = 10) -> Tuple[List[Dict[str, Any]], Spread]:
+    """Keep a running top N across pages so only N + one page of markets is held in memory."""
+    top_markets: List[Dict[str, Any]] = []
+    spreads = _spreads_vectorized(top_markets)
+    for page in pages:
+        top_markets, spreads = sort_markets_by_spread(top_markets + page, sort_by, top=top)
+    return top_markets, spreads
 
-def format_market_data(markets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Format market data for JSON output."""
-    formatted_markets = []
+def iter_formatted_markets(markets: List[Dict[str, Any]], spreads: Spread,
+                           order: Optional[np.ndarray] = None) -> Iterator[Dict[str, Any]]:
+    """Yield market data formatted for JSON output, one market at a time.
+    
+    order selects and orders the markets by index (default: all markets as given), so
+    rows are built straight from the spread columns without sorting the market list first.
+    """
+    if order is None:
+        order = np.arange(len(markets))
+    indices = order.tolist()
+    
+    # Gather the columns in output order and convert to plain Python values once
+    (yes_bid, yes_ask, no_bid, no_ask, yes_spread, no_spread,
+     absolute_spread, percentage_spread) = (column[order].tolist() for column in spreads)
     
-    for market in markets:
+    for j, i in enumerate(indices):
+        market = markets[i]
         formatted_market = {
             "ticker": market.get("ticker", ""),
             "title": market.get("title", ""),
             "status": market.get("status", ""),
             "close_time": market.get("close_time", ""),
             "open_time": market.get("open_time", ""),
-            "yes_bid": market.get("spread_data", {}).get("yes_bid", 0),
-            "yes_ask": market.get("spread_data", {}).get("yes_ask", 0),
-            "no_bid": market.get("spread_data", {}).get("no_bid", 0),
-            "no_ask": market.get("spread_data", {}).get("no_ask", 0),
-            "yes_spread": market.get("spread_data", {}).get("yes_spread", 0),
-            "no_spread": market.get("spread_data", {}).get("no_spread", 0),
-            "absolute_spread": market.get("spread_data", {}).get("absolute_spread", 0),
-            "percentage_spread": market.get("spread_data", {}).get("percentage_spread", 0),
+            "yes_bid": yes_bid[j],
+            "yes_ask": yes_ask[j],
+            "no_bid": no_bid[j],
+            "no_ask": no_ask[j],
+            "yes_spread": yes_spread[j],
+            "no_spread": no_spread[j],
+            "absolute_spread": absolute_spread[j],
+            "percentage_spread": percentage_spread[j],
             "volume": market.get("volume", 0),
             "volume_24h": market.get("volume_24h", 0),
             "last_price": market.get("last_price", 0)
         }
         
         # Add optional fields if they exist in the original market
-        if "event_ticker" in market:
-            formatted_market["event_ticker"] = market.get("event_ticker")
-        if "subtitle" in market:
-            formatted_market["subtitle"] = market.get("subtitle")
-        if "series_ticker" in market:
-            formatted_market["series_ticker"] = market.get("series_ticker")
+        for name in OPTIONAL_MARKET_FIELDS:
+            if name in market:
+                formatted_market[name] = market[name]
             
-        formatted_markets.append(formatted_market)
-    
-    return formatted_markets
+        yield formatted_market
+
+def _json_default(obj: Any) -> Any:
+    """Serialize values the JSON encoder doesn't handle (datetimes and other custom types)."""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
-def save_to_json(data: List[Dict[str, Any]], filename: str = "markets_by_spread.json") -> None:
-    """Save market data to JSON file in data directory."""
+def save_to_json(data: Iterable[Dict[str, Any]], filename: str = "markets_by_spread.json") -> None:
+    """Save market data to JSON file in data directory.
+    
+    Lists are written in one go; other iterables (e.g. generators) are written
+    item by item so the whole dataset never has to be held in memory.
+    """
     try:
         # Ensure data directory exists
         os.makedirs(DATA_DIR, exist_ok=True)
@@ -218,25 +349,32 @@ def save_to_json(data: List[Dict[str, Any]], filename: str = "markets_by_spread.
         else:
             filepath = filename
         
-        # Convert datetime objects to strings for JSON serialization
-        def convert_datetime(obj):
-            if hasattr(obj, 'isoformat'):
-                return obj.isoformat()
-            return obj
-        
-        # Recursively convert datetime objects
-        def clean_data(data):
-            if isinstance(data, dict):
-                return {k: clean_data(v) for k, v in data.items()}
-            elif isinstance(data, list):
-                return [clean_data(item) for item in data]
-            else:
-                return convert_datetime(data)
-        
-        cleaned_data = clean_data(data)
-        
-        with open(filepath, 'w') as f:
-            json.dump(cleaned_data, f, indent=2)
+        # orjson writes datetimes as isoformat(), matching _json_default without orjson
+        if orjson is not None:
+            options = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+            with open(filepath, 'wb') as f:
+                if isinstance(data, list):
+                    f.write(orjson.dumps(data, default=_json_default, option=options))
+                else:
+                    f.write(b'[')
+                    separator = b'\n'
+                    for item in data:
+                        f.write(separator)
+                        f.write(orjson.dumps(item, default=_json_default, option=options))
+                        separator = b',\n'
+                    f.write(b'\n]' if separator != b'\n' else b']')
+        else:
+            with open(filepath, 'w') as f:
+                if isinstance(data, list):
+                    json.dump(data, f, indent=2, default=_json_default)
+                else:
+                    f.write('[')
+                    separator = '\n'
+                    for item in data:
+                        f.write(separator)
+                        f.write(json.dumps(item, indent=2, default=_json_default))
+                        separator = ',\n'
+                    f.write('\n]' if separator != '\n' else ']')
         print(f"Data saved to {filepath}")
     except Exception as e:
         print(f"Error saving to JSON: {e}")
@@ -251,11 +389,16 @@ def main():
                        help="Output JSON filename (default: markets_by_spread.json)")
     parser.add_argument("--top", type=int, help="Show only top N markets by spread")
     parser.add_argument("--all", action="store_true", help="Fetch all active markets (same as no limit)")
+    parser.add_argument("--markets-file", type=str,
+                       help="File with market tickers (one per line) to fetch in a single run instead of all markets")
     
     args = parser.parse_args()
     
     # Determine the limit
-    if args.all or args.limit is None:
+    if args.markets_file:
+        limit = None
+        print(f"Fetching markets listed in {args.markets_file} from Kalshi...")
+    elif args.all or args.limit is None:
         limit = None
         print("Fetching ALL active markets from Kalshi...")
     else:
@@ -270,31 +413,57 @@ def main():
         return
     
     # Get markets (status filter removed due to SDK issues)
-    markets = get_markets(client, limit=limit)
-    
-    if not markets:
-        print("No markets found or error occurred.")
-        return
-    
-    print(f"Found {len(markets)} markets")
-    
-    # Sort by spread
-    sorted_markets = sort_markets_by_spread(markets, args.sort_by)
-    
-    # Limit to top N if specified
-    if args.top:
-        sorted_markets = sorted_markets[:args.top]
+    if args.markets_file:
+        # Batch mode: one process and one client for every listed ticker
+        try:
+            tickers = load_tickers(args.markets_file)
+        except OSError as e:
+            print(f"Error reading markets file: {e}")
+            return
+        
+        markets = get_markets_by_ticker(client, tickers)
+        
+        if not markets:
+            print("No markets found or error occurred.")
+            return
+        
+        spreads = _spreads_vectorized(markets)
+        order = rank_by_spread(spreads, args.sort_by, top=args.top or None)
+    elif args.top:
+        # Only the running top N is kept while pages stream in
+        try:
+            markets, spreads = select_top_markets(iter_market_pages(client, limit=limit), args.sort_by, args.top)
+        except Exception as e:
+            print(f"Error fetching markets: {e}")
+            return
+        
+        # Already in spread order
+        order = np.arange(len(markets))
+        
+        if not markets:
+            print("No markets found or error occurred.")
+            return
+        
         print(f"Showing top {args.top} markets by {args.sort_by} spread")
+    else:
+        markets = get_markets(client, limit=limit)
+        
+        if not markets:
+            print("No markets found or error occurred.")
+            return
+        
+        print(f"Found {len(markets)} markets")
+        
+        # Sort by spread
+        spreads = _spreads_vectorized(markets)
+        order = rank_by_spread(spreads, args.sort_by)
     
-    # Format data
-    formatted_markets = format_market_data(sorted_markets)
-    
-    # Save to JSON
-    save_to_json(formatted_markets, args.output)
+    # Format and save to JSON one market at a time, straight from the spread columns
+    save_to_json(iter_formatted_markets(markets, spreads, order), args.output)
     
     # Print summary
     print(f"\nTop 5 markets by {args.sort_by} spread:")
-    for i, market in enumerate(formatted_markets[:5], 1):
+    for i, market in enumerate(iter_formatted_markets(markets, spreads, order[:5]), 1):
         spread_value = market["percentage_spread"] if args.sort_by == "percentage" else market["absolute_spread"]
         print(f"{i}. {market['ticker']}: {market['title']}")
         print(f"   Spread: {spread_value:.2f}{'%' if args.sort_by == 'percentage' else '¢'}")
@@ -9,16 +9,43 @@ import datetime
 import time
 import json
 import argparse
+import signal
 import requests
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from Getdata.snapshotFiles import (COMPRESSION_EXTENSIONS, SnapshotCompressor, iter_snapshots,
+                                   open_snapshot_file, zstandard)
 
-# Force unbuffered output for log files
-sys.stdout = sys.__stdout__  # Ensure we're using real stdout
+# Timestamp format for log lines (prints use flush=True so log files update immediately)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 class OrderBookListener:
-    def __init__(self, marketId, demo=False):
+    def __init__(self, marketId, demo=False, compress="zstd"):
         self.client = KalshiAPI().get_client(demo=demo)
         self.marketId = marketId
         self.demo = demo
+        if compress == "zstd" and zstandard is None:
+            print("zstandard not installed, falling back to gzip compression for orderbook snapshots")
+            compress = "gzip"
+        self.compress = compress
+        self._snapshot_count = 0  # Snapshots written by this process
+        self._fds = {}  # filepath -> append-only file descriptor, reused across snapshots
+        self._compressors = {}  # filepath -> SnapshotCompressor for compressed files, one stream per run
+        
+        # Resolve the output directory once (project root is the parent of Getdata)
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orderbook_dir = os.path.join(project_root, "data", "orderbookData")
+        os.makedirs(self.orderbook_dir, exist_ok=True)
+        
+        # Persistent session so the TCP/TLS connection is reused between fetches
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retries))
 
     def get_order_book(self):
         """Fetch the current orderbook for the market using direct HTTP request."""
@@ -29,31 +56,27 @@ class OrderBookListener:
         # Build URL - API returns yes/no instead of true/false
         url = f"{base_url}/markets/{self.marketId}/orderbook"
         
-        # Make direct HTTP request to get raw JSON
-        response = requests.get(url)
+        # Make direct HTTP request to get raw JSON (reuses the pooled connection)
+        response = self.session.get(url, timeout=10)
         response.raise_for_status()  # Raise exception for bad status codes
         
         # Return raw JSON data which has correct yes/no fields
+        if orjson is not None:
+            return orjson.loads(response.content)
         return response.json()
 
     def save_order_book(self, order_book_response, filename=None):
-        """Append orderbook to JSON file with timestamp in data/orderbookData directory."""
-        # Create data/orderbookData directory if it doesn't exist
-        # Get project root directory (parent of Getdata)
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        orderbook_dir = os.path.join(project_root, "data", "orderbookData")
-        os.makedirs(orderbook_dir, exist_ok=True)
-        
+        """Append orderbook snapshot as one JSON line to a .jsonl (optionally compressed) file in data/orderbookData directory."""
         # Default filename includes market ID to avoid conflicts
         if filename is None:
             # Sanitize market ID for filename (remove special chars)
             safe_market_id = self.marketId.replace('/', '_').replace('\\', '_')
-            filename = f"orderBook_{safe_market_id}.json"
+            filename = f"orderBook_{safe_market_id}{COMPRESSION_EXTENSIONS[self.compress]}"
         
         # Always use just the basename (strip any path that might be provided)
         # This ensures files are ALWAYS saved to data/orderbookData directory
         filename_basename = os.path.basename(filename)
-        filepath = os.path.join(orderbook_dir, filename_basename)
+        filepath = os.path.join(self.orderbook_dir, filename_basename)
         
         # order_book_response is already a dict from direct HTTP request
         if isinstance(order_book_response, dict):
@@ -67,41 +90,72 @@ class OrderBookListener:
             else:
                 orderbook_data = str(order_book_response)
         
-        # Prepare new snapshot
+        # Prepare new snapshot (unix epoch nanoseconds; readers convert to datetime)
         new_snapshot = {
-            "timestamp": datetime.datetime.now().isoformat(),
+            "ts_ns": time.time_ns(),
             "market_id": self.marketId,
             "order_book": orderbook_data
         }
         
-        # Load existing data if file exists, otherwise start with empty list
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, "r") as f:
-                    existing_data = json.load(f)
-                # Handle both old format (single object) and new format (array)
-                if isinstance(existing_data, list):
-                    # Already in array format, append to it
-                    existing_data.append(new_snapshot)
-                    all_data = existing_data
-                else:
-                    # Old format (single object), convert to array with old + new
-                    all_data = [existing_data, new_snapshot]
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Warning: Could not read existing file, starting fresh: {e}")
-                all_data = [new_snapshot]
+        # Append one line per snapshot (no need to read or rewrite previous snapshots)
+        if orjson is not None:
+            line = orjson.dumps(new_snapshot, default=str, option=orjson.OPT_APPEND_NEWLINE)
         else:
-            # File doesn't exist, start with new snapshot
-            all_data = [new_snapshot]
+            line = (json.dumps(new_snapshot, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+        self._append(filepath, line)
+        self._snapshot_count += 1
         
-        # Save all data (appending new snapshot to array)
-        with open(filepath, "w") as f:
-            json.dump(all_data, f, indent=2, default=str)
-        
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        snapshot_count = len(all_data)
-        print(f"[{timestamp}] Orderbook snapshot #{snapshot_count} saved for {self.marketId} to {filepath} (total snapshots: {snapshot_count})")
-        sys.stdout.flush()
+        timestamp = time.strftime(TIME_FORMAT)
+        print(f"[{timestamp}] Orderbook snapshot #{self._snapshot_count} saved for {self.marketId} to {filepath}", flush=True)
+
+    def _append(self, filepath, line):
+        """Append one snapshot line to filepath (compressed on the file's stream) with a single write on a reused O_APPEND descriptor."""
+        fd = self._fds.get(filepath)
+        if fd is None:
+            if filepath.endswith(('.zst', '.gz')):
+                compressor = self._compressors[filepath] = SnapshotCompressor(filepath)
+                if os.path.exists(filepath):
+                    self._restream(filepath, compressor)
+            fd = os.open(filepath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._fds[filepath] = fd
+        compressor = self._compressors.get(filepath)
+        os.write(fd, compressor.compress(line) if compressor is not None else line)
+
+    def _restream(self, filepath, compressor):
+        """
+        Rewrite an existing compressed file's snapshots through this run's stream, so new snapshots can be appended.
+
+        A run that was killed leaves its frame/member unterminated and nothing can follow it in the same file;
+        readers still stop cleanly after its last flushed snapshot, so those snapshots are carried over instead.
+        """
+        tmp_path = filepath + ".tmp"
+        count = 0
+        with open(tmp_path, 'wb') as out, open_snapshot_file(filepath) as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        out.write(compressor.compress(line.rstrip('\n').encode('utf-8') + b'\n'))
+                        count += 1
+            except EOFError:
+                pass  # Unterminated gzip member left by a killed run
+        os.replace(tmp_path, filepath)
+        print(f"[{time.strftime(TIME_FORMAT)}] Carried {count} existing snapshot(s) over into {filepath}", flush=True)
+
+    def close(self):
+        """End each file's compression stream and close all open snapshot file descriptors."""
+        while self._fds:
+            filepath, fd = self._fds.popitem()
+            compressor = self._compressors.pop(filepath, None)
+            try:
+                if compressor is not None:
+                    os.write(fd, compressor.finish())
+            finally:
+                os.close(fd)
+
+    def __del__(self):
+        # _fds may not exist if __init__ failed before setting it
+        if getattr(self, '_fds', None):
+            self.close()
 
     def run(self, interval_minutes=5):
         """Continuously fetch and save orderbook at specified interval."""
@@ -109,36 +163,77 @@ class OrderBookListener:
         print(f"Starting orderbook listener for market: {self.marketId}")
         print(f"Fetching orderbook every {interval_minutes} minutes...")
         
+        # Turn SIGTERM (e.g. from kill or a process manager) into a normal exit so files get closed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
         fetch_count = 0
+        # Fetches are scheduled on a monotonic clock so fetch latency doesn't push later fetches back
+        next_deadline = time.monotonic()
         try:
             while True:
+                next_deadline += interval_seconds
                 fetch_count += 1
-                current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                current_time = time.strftime(TIME_FORMAT)
                 
-                print(f"[{current_time}] === Fetch #{fetch_count} - Starting orderbook fetch for {self.marketId} ===")
-                sys.stdout.flush()  # Force immediate write to log file
+                print(f"[{current_time}] === Fetch #{fetch_count} - Starting orderbook fetch for {self.marketId} ===", flush=True)
                 
                 try:
                     order_book = self.get_order_book()
                     self.save_order_book(order_book)
-                    print(f"[{current_time}] ✓ Successfully fetched and saved orderbook (fetch #{fetch_count})")
-                    sys.stdout.flush()
+                    print(f"[{current_time}] ✓ Successfully fetched and saved orderbook (fetch #{fetch_count})", flush=True)
                 except Exception as e:
-                    print(f"[{current_time}] ✗ Error fetching orderbook (fetch #{fetch_count}): {e}")
-                    sys.stdout.flush()
+                    print(f"[{current_time}] ✗ Error fetching orderbook (fetch #{fetch_count}): {e}", flush=True)
                 
-                # Wait for the specified interval before next fetch
+                # Wait until the next scheduled fetch
+                sleep_for = next_deadline - time.monotonic()
                 wait_start_time = datetime.datetime.now()
-                next_fetch_time = (wait_start_time + datetime.timedelta(minutes=interval_minutes)).strftime('%Y-%m-%d %H:%M:%S')
-                print(f"[{wait_start_time.strftime('%Y-%m-%d %H:%M:%S')}] Waiting {interval_minutes} minutes until next fetch (next: {next_fetch_time})...")
-                print(f"[{wait_start_time.strftime('%Y-%m-%d %H:%M:%S')}] Listener is active and will continue running...")
-                sys.stdout.flush()
+                wait_ts = wait_start_time.strftime(TIME_FORMAT)
+                if sleep_for < 0:
+                    # Fetch overran one or more intervals: skip the missed ticks instead of catching up
+                    missed = int(-sleep_for // interval_seconds) + 1
+                    next_deadline += missed * interval_seconds
+                    sleep_for = next_deadline - time.monotonic()
+                    print(f"[{wait_ts}] Fetch took longer than the interval, skipping {missed} missed fetch(es)")
+                next_fetch_time = (wait_start_time + datetime.timedelta(seconds=sleep_for)).strftime(TIME_FORMAT)
+                print(f"[{wait_ts}] Waiting {sleep_for / 60:.1f} minutes until next fetch (next: {next_fetch_time})...")
+                print(f"[{wait_ts}] Listener is active and will continue running...", flush=True)
                 
-                # Sleep for the full interval
-                time.sleep(interval_seconds)
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
                 
         except KeyboardInterrupt:
             print("\nOrderbook listener stopped by user")
+        finally:
+            self.close()
+
+def _legacy_snapshot(snapshot):
+    """Rewrite a snapshot's ts_ns as the legacy local-time ISO "timestamp" field (first key, as the old writer did)."""
+    ts_ns = snapshot.get("ts_ns")
+    if ts_ns is None:
+        return snapshot
+    timestamp = datetime.datetime.fromtimestamp(ts_ns // 1_000_000_000).replace(microsecond=ts_ns // 1000 % 1_000_000)
+    legacy = {"timestamp": timestamp.isoformat()}
+    legacy.update((key, value) for key, value in snapshot.items() if key != "ts_ns")
+    return legacy
+
+def jsonl_to_json(jsonl_path, json_path=None):
+    """Convert a .jsonl (optionally .zst/.gz compressed) orderbook file to the legacy JSON array format.
+    
+    Args:
+        jsonl_path: Path to the snapshot file written by OrderBookListener
+        json_path: Output path (default: same path with .json extension)
+    
+    Returns:
+        Path of the written JSON file
+    """
+    if json_path is None:
+        json_path = jsonl_path.split(".jsonl")[0] + ".json"
+    
+    snapshots = [_legacy_snapshot(snapshot) for snapshot in iter_snapshots(jsonl_path)]
+    
+    with open(json_path, "w") as f:
+        json.dump(snapshots, f, indent=2, default=str)
+    return json_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="OrderBook Listener - Monitor market orderbooks")
@@ -159,8 +254,14 @@ if __name__ == "__main__":
         action="store_true",
         help="Use demo environment instead of production"
     )
+    parser.add_argument(
+        "--compress",
+        choices=list(COMPRESSION_EXTENSIONS),
+        default="zstd",
+        help="Compression for the snapshot file (default: zstd, falls back to gzip if zstandard is not installed)"
+    )
     
     args = parser.parse_args()
     
-    orderBookListener = OrderBookListener(marketId=args.market_id, demo=args.demo)
+    orderBookListener = OrderBookListener(marketId=args.market_id, demo=args.demo, compress=args.compress)
     orderBookListener.run(interval_minutes=args.interval)
@@ -0,0 +1,92 @@
+"""Orderbook snapshot files: compressed writing and reading, with no dependency on the Kalshi SDK.
+
+Shared by orderBookListener.py (writer) and visualize_orderbook.py (offline reader).
+"""
+
+import os
+import io
+import gzip
+import json
+import mmap
+import zlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Snapshot file extension for each --compress option. Each listener run keeps one compression
+# stream per file and flushes it after every snapshot, so snapshots compress against the ones
+# before them and the file is readable up to the last snapshot while it is being written.
+COMPRESSION_EXTENSIONS = {
+    "zstd": ".jsonl.zst",
+    "gzip": ".jsonl.gz",
+    "none": ".jsonl"
+}
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+class SnapshotCompressor:
+    """Streaming compressor for one snapshot file (the whole file is one zstd frame or gzip member)."""
+    def __init__(self, filepath):
+        if filepath.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError("zstandard is required to write .zst files (pip install zstandard)")
+            self._stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL, write_checksum=False).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data):
+        """Compress one snapshot line, flushed so it can be decoded without what follows."""
+        return self._stream.compress(data) + self._stream.flush(self._sync)
+
+    def finish(self):
+        """Return the bytes that end the frame/member."""
+        return self._stream.flush()
+
+def open_snapshot_file(filepath):
+    """Open a (possibly compressed) .jsonl snapshot file for reading as text lines."""
+    if filepath.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard is required to read .zst files (pip install zstandard)")
+        raw = open(filepath, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, 'rt', encoding='utf-8')
+    return open(filepath, 'r')
+
+def iter_snapshots(filepath):
+    """Yield snapshots one at a time from a .jsonl (optionally .zst/.gz compressed) orderbook file.
+    
+    Plain files are memory-mapped and scanned sequentially, so large files are never
+    loaded into memory as a whole.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    
+    if filepath.endswith(('.zst', '.gz')):
+        with open_snapshot_file(filepath) as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield loads(line)
+            except EOFError:
+                # Last gzip member not terminated yet (listener still running, or it was killed)
+                pass
+        return
+    
+    with open(filepath, 'rb') as f:
+        # mmap can't map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            for line in iter(mm.readline, b''):
+                if line.strip():
+                    yield loads(line)
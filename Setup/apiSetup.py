@@ -26,8 +26,13 @@ Configuration:
 
 from kalshi_python import KalshiClient
 from kalshi_python.configuration import Configuration
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+import base64
+import functools
 import os
 import sys
+import time
 
 # Add Setup directory to path for local imports
 SETUP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -52,9 +57,37 @@ PRODUCTION_PRIVATE_KEY_FILE = os.path.join(SETUP_DIR, "private_key.pem")
 DEMO_PRIVATE_KEY_FILE = os.path.join(SETUP_DIR, "private_demo_key.pem")
 
 
+@functools.lru_cache(maxsize=2)
+def _load_key(path):
+    """Read a private key file once per process (keys don't change while running)."""
+    with open(path, "r") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=2)
+def _load_private_key(path):
+    """Parse a PEM private key once per process so signing reuses the key object."""
+    return serialization.load_pem_private_key(_load_key(path).encode(), password=None)
+
+
+# Max pooled keep-alive connections per client; enough for concurrent order submission
+# (BasicMM sends up to 16 orders at once) without urllib3 discarding connections
+CONNECTION_POOL_MAXSIZE = 32
+
+# One client per environment, so every caller in the process shares its connection pool
+_clients = {}
+
+
+# RSA-PSS padding used for Kalshi request signatures (built once, reused for every request)
+_PSS_PADDING = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.DIGEST_LENGTH)
+
+
 class KalshiAPI:
 
     def get_client(self, demo=False):
+        if demo in _clients:
+            return _clients[demo]
+
         if demo:
             # Demo environment configuration
             config = Configuration(
@@ -67,20 +100,18 @@ class KalshiAPI:
                 host="https://api.elections.kalshi.com/trade-api/v2"
             )
             print("Using Kalshi PRODUCTION environment")
+        config.connection_pool_maxsize = CONNECTION_POOL_MAXSIZE
 
         # For authenticated requests
         try:
             if demo:
                 # Use demo private key from file
-                with open(DEMO_PRIVATE_KEY_FILE, "r") as f:
-                    private_key = f.read()
+                private_key = _load_key(DEMO_PRIVATE_KEY_FILE)
                 config.api_key_id = DEMO_API_KEY_ID
                 config.private_key_pem = private_key
             else:
                 # Use production private key from file in Setup directory
-                production_key_path = os.path.join(SETUP_DIR, "private_key.pem")
-                with open(production_key_path, "r") as f:
-                    private_key = f.read()
+                private_key = _load_key(PRODUCTION_PRIVATE_KEY_FILE)
                 
                 # Get API key ID from config file or environment variable
                 if PRODUCTION_API_KEY_ID is None:
@@ -99,4 +130,26 @@ class KalshiAPI:
 
         # Initialize the client
         client = KalshiClient(config)
-        return client
\ No newline at end of file
+        _clients[demo] = client
+        return client
+
+    def sign(self, message, demo=False):
+        """Sign message bytes with the RSA-PSS/SHA256 private key for the environment."""
+        key_file = DEMO_PRIVATE_KEY_FILE if demo else PRODUCTION_PRIVATE_KEY_FILE
+        return _load_private_key(key_file).sign(message, _PSS_PADDING, hashes.SHA256())
+
+    def auth_headers(self, method, path, demo=False):
+        """Build Kalshi auth headers for a direct REST request.
+        
+        Args:
+            method: HTTP method, e.g. "GET"
+            path: Request path without query string, e.g. "/trade-api/v2/portfolio/balance"
+            demo: Sign with the demo key instead of the production key
+        """
+        timestamp = str(int(time.time() * 1000))
+        signature = self.sign(f"{timestamp}{method.upper()}{path}".encode(), demo=demo)
+        return {
+            "KALSHI-ACCESS-KEY": DEMO_API_KEY_ID if demo else PRODUCTION_API_KEY_ID,
+            "KALSHI-ACCESS-SIGNATURE": base64.b64encode(signature).decode(),
+            "KALSHI-ACCESS-TIMESTAMP": timestamp
+        }
\ No newline at end of file
@@ -1,15 +1,38 @@
 import sys
 import os
 import csv
+import io
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import ConnectTimeoutError
+import types
+import traceback
+import uuid
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from collections import OrderedDict
+from urllib.parse import urlparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from Setup.apiSetup import KalshiAPI
+from Strategies.marketBook import MarketBook, MarketState, close_time_to_epoch
+from Strategies.stoploss import write_stoploss
 import datetime
 import asyncio
+import threading
 import time
+import numpy as np
+from operator import attrgetter, itemgetter
+from itertools import repeat
+from concurrent.futures import Future, ThreadPoolExecutor
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 ''' This file:
 get markets
@@ -19,33 +42,295 @@ trade
 trade single
 run
 '''
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKET_DATA_DIR = os.path.join(PROJECT_ROOT, "data", "marketData")
+TRADE_LOGS_DIR = os.path.join(PROJECT_ROOT, "logs", "trade_logs")
+STOPLOSS_DIR = os.path.join(PROJECT_ROOT, "Stoploss")
+ORDER_CONCURRENCY = 16  # Max create_order requests in flight at once
+ORDER_RATE_LIMIT = 10  # Max order writes (creates/cancels) sent per second, Kalshi's basic-tier write limit
+BATCH_ORDERS_PATH = "/portfolio/orders/batched"  # Submits the order legs of several markets in one request
+BATCH_ORDERS_MAX_MARKETS = ORDER_RATE_LIMIT // 2  # Markets (two legs each) per batched request; every leg is a write
+BATCH_ORDERS_RATE_LIMITED_DELAY = 1.0  # Seconds to back off after a rate-limited (429) batch when it sends no Retry-After
+MARKETS_PAGE_LIMIT = 1000  # Most markets GET /markets returns per request (its default page is 100)
+FETCHED_MARKET_TTL = 0.5  # Seconds a market fetched by get_price is reused before fetching it again
+FETCHED_MARKET_CACHE_SIZE = 4096  # Max markets kept in the get_price fetch cache (least recently used evicted)
+BANKROLL_RESYNC_SECONDS = 30  # Seconds run_async trusts its locally tracked bankroll before re-reading the balance
+OPPORTUNITY_MIN_SPREAD = 0.03  # Spread (probability units) a market must exceed to be an opportunity
+OPPORTUNITY_MIN_VOLUME = 1000  # Volume a market must exceed to be an opportunity
+_quote_fields = attrgetter('yes_bid', 'yes_ask', 'volume')
+_filter_fields = attrgetter('ticker', 'yes_bid', 'yes_ask', 'volume')
+
+# Opportunity CSV columns; every column after spread is read from the market by _csv_fields
+OPPORTUNITY_CSV_HEADER = (
+    "timestamp", "ticker", "title", "spread", "yes_bid", "yes_ask", "no_bid", "no_ask",
+    "volume", "volume_24h", "last_price", "status", "close_time", "event_ticker"
+)
+_csv_fields = attrgetter('ticker', 'title', 'yes_bid', 'yes_ask', 'no_bid', 'no_ask', 'volume',
+                         'volume_24h', 'last_price', 'status', 'close_time', 'event_ticker')
+
+def _opportunity_spread(yes_bid, yes_ask):
+    """
+    Spread in probability units. Prices might be in cents (0-100) or probability (0-1): when either
+    is above 1 both are taken as cents. Works on scalars and NumPy arrays, and is what both the full
+    scan (identify_market_opportunities) and rescore_markets compare to OPPORTUNITY_MIN_SPREAD.
+    """
+    # Divide by 100 for cents, by 1 otherwise (arithmetic on the comparison, so it also applies element-wise)
+    return (yes_ask - yes_bid) / (1.0 + 99.0 * ((yes_bid > 1) | (yes_ask > 1)))
+
+if njit is not None:
+    _opportunity_spread_jit = njit(cache=True)(_opportunity_spread)
+
+    @njit(cache=True)
+    def _scan_opportunities(yes_bid, yes_ask, volume, min_spread, min_volume, out_idx, out_spread):
+        """Fused spread + threshold scan, writes matching (index, spread) pairs and returns how many."""
+        n = 0
+        for i in range(yes_bid.shape[0]):
+            spread = _opportunity_spread_jit(yes_bid[i], yes_ask[i])
+            if spread > min_spread and volume[i] > min_volume:
+                out_idx[n] = i
+                out_spread[n] = spread
+                n += 1
+        return n
+else:
+    _scan_opportunities = None
+
+_created_dirs = set()  # Output directories already created by this process
+
+def _ensure_dir(path):
+    """os.makedirs(path, exist_ok=True), skipped after the first call per path in this process."""
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+
+ORDER_ID_ATTRS = ("order_id", "id", "orderId")  # Where an order object/dict may keep its ID
+
+def _order_id(order):
+    """Return an order's ID (first of ORDER_ID_ATTRS that is set), or None."""
+    if order is None:
+        return None
+    if isinstance(order, dict):
+        for key in ORDER_ID_ATTRS:
+            value = order.get(key)
+            if value:
+                return value
+        return None
+    for name in ORDER_ID_ATTRS:
+        value = getattr(order, name, None)
+        if value:
+            return value
+    return None
+
+def _write_stoploss_files(entries, detail=print, log=print, debug=False):
+    """
+    Write one Stoploss/<market_id>.json per stop loss entry (the layout websocket_handler reads),
+    in the format shared with it through Strategies.stoploss. Tracebacks for failed writes are only logged when debug.
+    """
+    for stoploss_data in entries:
+        market_id = stoploss_data['market_id']
+        try:
+            # Write to file (market name as filename)
+            write_stoploss(os.path.join(STOPLOSS_DIR, f"{market_id}.json"), stoploss_data)
+            detail(f"✓ Stop loss file created for {market_id}")
+        except Exception as e:
+            log(f"⚠ Error creating stop loss file for {market_id}: {e}")
+            if debug:
+                log(traceback.format_exc().rstrip())
+
+def _write_csv_atomic(csv_file, text):
+    """Write text to a temporary file and swap it into place, so a crash never leaves a partial CSV behind."""
+    tmp_file = csv_file + ".tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(text.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, csv_file)
+    except OSError as e:
+        print(f"Error saving market opportunities to {csv_file}: {e}")
+        raise
+    print(f"Market opportunities saved to: {csv_file}")
+
+def quote_prices_batch(yes_bid, yes_ask):
+    """
+    Vectorized BasicMM.quote_prices over arrays of yes bids/asks (NaN where missing).
+    
+    Returns:
+        Tuple of (buy_price_cents, sell_price_cents, valid) arrays; prices are only meaningful where valid
+    """
+    with np.errstate(invalid='ignore'):
+        # 0 is not a valid price, so treat it as missing data (as are NaN/inf and out-of-range prices)
+        base_buy = np.trunc(yes_bid)
+        base_sell = np.trunc(yes_ask)
+        valid = (np.isfinite(yes_bid) & np.isfinite(yes_ask) & (yes_bid != 0) & (yes_ask != 0) &
+                 (base_buy >= 0) & (base_buy <= 100) & (base_sell >= 0) & (base_sell <= 100))
+    base_buy = np.where(valid, base_buy, 0).astype(np.int64)
+    base_sell = np.where(valid, base_sell, 0).astype(np.int64)
+    
+    # Inside the spread by one cent, clamped to the API's 1-99 range
+    buy = np.clip(base_buy + 1, 1, 99)
+    sell = np.clip(base_sell - 1, 1, 99)
+    
+    # Where that would cross, quote around the mid-price instead (keeping buy < sell)
+    crossed = buy >= sell
+    mid = (base_buy + base_sell) // 2
+    mid_sell = np.clip(mid + 1, 1, 99)
+    mid_buy = np.clip(mid - 1, 1, 99)
+    mid_buy = np.where(mid_buy >= mid_sell, np.maximum(1, mid_sell - 1), mid_buy)
+    buy = np.where(crossed, mid_buy, buy)
+    sell = np.where(crossed, mid_sell, sell)
+    return buy, sell, valid
+
+def _request_not_sent(error):
+    """True if a requests error was raised while connecting, i.e. before the request reached the server."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # NewConnectionError (refused, DNS failure) is a ConnectTimeoutError too
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+class OrderRateLimiter:
+    """
+    Thread-safe token bucket: acquire(n) blocks until n order writes can be sent
+    without exceeding rate per second (bursts of up to rate are allowed).
+    """
+    def __init__(self, rate=ORDER_RATE_LIMIT):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        # More than the bucket can ever hold is taken in bucket-sized chunks, keeping the same overall rate
+        while n > self.rate:
+            self.acquire(self.rate)
+            n -= self.rate
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+class MarketResponse:
+    def __init__(self, markets):
+        self.markets = markets
+
 class BasicMM:
-    def __init__(self, reserve_limit = 10, demo=False):
+    def __init__(self, reserve_limit = 10, demo=False, live_market_data=False, debug=False, verbose=True):
         self.client = KalshiAPI().get_client(demo=demo)
+        self.debug = debug  # Print get_price's market diagnostics (off in normal trading runs)
+        self.verbose = verbose  # Print trade()'s per-market progress (errors and the session summary always print)
         self.market_opportunities = []
         self.market_spreads = {}  # Dictionary mapping market ticker to spread
         self.reserve_limit = reserve_limit # how much to keep in reserve
         self.demo = demo
         self.last_cursor = None  # Store the last cursor for pagination continuation
+        self.http_session = requests.Session()  # Keep-alive session for raw HTTP requests
+        # Enough pooled connections for every order worker, and retries for transient errors
+        # (Retry's default allowed_methods leave POST out, so orders are never re-sent)
+        self.http_session.mount("https://", HTTPAdapter(
+            pool_maxsize=ORDER_CONCURRENCY,
+            max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        self.market_index = {}  # Market ticker -> market object from the last identify_market_opportunities
+        self.market_prices = {}  # Market ticker -> (yes_bid, yes_ask) from the last identify_market_opportunities
+        self._opportunity_columns = None  # (market_opportunities, yes_bid, yes_ask, volume, spread) arrays from the last scan
+        self._close_columns = None  # (markets, close_ts, undated, unparseable) for the last list date-filtered
+        self._bankroll_cents = None  # run_async's bankroll (cents), tracked from trade() between balance reads
+        self._bankroll_stale_after = 0.0  # time.monotonic() after which _bankroll_cents is re-read from the API
+        self._fetched_markets = OrderedDict()  # Market ticker -> (time.monotonic() of fetch, market) for get_price misses
+        self._last_csv_fingerprint = None  # Fingerprint of the last opportunity set written to CSV
+        self._csv_executor = None  # Single background thread for opportunity CSV writes (created on first write)
+        self.csv_future = None  # Future for the most recent CSV write (result() waits for it to reach disk)
+        self._trade_log_fh = None  # Open handle on this session's trade log (see _trade_log)
+        
+        # Session-level output paths, resolved (and their directories created) once
+        self._session_start_time = datetime.datetime.now()
+        self._trade_log_path = os.path.join(TRADE_LOGS_DIR, f"tradeLimitOrders_{self._session_start_time.strftime('%Y%m%d_%H%M%S')}.log")
+        self._market_data_dir = MARKET_DATA_DIR
+        _ensure_dir(TRADE_LOGS_DIR)
+        _ensure_dir(self._market_data_dir)
+        self.order_rate_limiter = OrderRateLimiter()  # Shared by every order write this instance sends
+        self._batch_orders_supported = True  # Cleared if the batched orders endpoint is refused (e.g. not an advanced API account)
+        
+        # Optional live market data: one WebSocket ticker subscription keeps an in-memory book,
+        # so each cycle reads it instead of re-paginating every market over REST
+        self.market_book = None
+        if live_market_data:
+            self.market_book = MarketBook(
+                fetch_snapshot=lambda: self._get_markets_rest(max_total=None, page_size=MARKETS_PAGE_LIMIT, status="open",
+                                                              quiet=True, track_cursor=False).markets,
+                demo=demo
+            )
+            self.market_book.start()
+
+    def get_markets(self, max_total=100000, page_size=MARKETS_PAGE_LIMIT, status="open", start_cursor=None):
+        """Get markets from the live market book if enabled, otherwise via REST pagination.
+
+        Args:
+            max_total: Maximum number of markets to collect. If None, returns all available markets.
+            page_size: Number of markets per request (REST only)
+            status: Market status filter (REST only)
+            start_cursor: Optional cursor to continue REST pagination from
 
-    def get_markets(self, max_total=100000, page_size=100, status="open", start_cursor=None):
+        Returns:
+            MarketResponse object with a list of MarketState (slotted market objects)
+        """
+        if self.market_book is not None and start_cursor is None:
+            if not self.market_book.wait_ready(timeout=600):
+                print("Warning: market book has no snapshot yet, falling back to REST")
+            else:
+                markets = self.market_book.snapshot()
+                return MarketResponse(markets if max_total is None else markets[:max_total])
+        # Project the SDK objects once (page by page, while the next page downloads) so every
+        # later pass uses plain slot attributes
+        return self._get_markets_rest(max_total=max_total, page_size=page_size, status=status,
+                                      start_cursor=start_cursor, project=MarketState.from_market)
+
+    def _get_markets_rest(self, max_total=100000, page_size=MARKETS_PAGE_LIMIT, status="open", start_cursor=None, project=None, quiet=False, track_cursor=True):
         """Fetch markets with robust pagination.
+        
+        The next page is requested on a background thread as soon as its cursor is known,
+        so each page is processed while the following one is still in flight.
 
         Args:
             max_total: Maximum number of markets to collect. If None, fetches all available markets.
-            page_size: Number of markets per request (server typically caps at 100)
+            page_size: Number of markets per request (capped at MARKETS_PAGE_LIMIT)
             status: Market status filter (e.g., "open", "active", "closed")
             start_cursor: Optional cursor to start from (for continuing pagination)
                           If None, starts from the beginning
+            project: Optional callable applied to each market as its page arrives (e.g. MarketState.from_market)
+            quiet: Drop progress and summary lines (errors still print), for background refreshes
+            track_cursor: Store the final cursor in self.last_cursor for get_next_markets(). Background
+                          fetches pass False so they don't move the main thread's pagination position
         
         Returns:
             MarketResponse object with markets list
         """
-        all_markets = []
+        if project is None:
+            project = lambda market: market
+        # Progress and summary lines; dropped when quiet
+        progress = (lambda line: None) if quiet else print
+        last_cursor = self.last_cursor  # Written back to self.last_cursor at the end, when track_cursor
+        # Preallocate for max_total and fill by index, instead of growing the list page by page
+        all_markets = [None] * max_total if max_total is not None else []
+        market_count = 0  # Filled length of all_markets
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+        prefetched = None  # Future for the next page, submitted before the current page is processed
+        prefetched_raw = None  # Same, over raw HTTP, once the SDK has failed to validate a page
         # Use provided cursor, or None to start from beginning
         cursor = start_cursor
         page_count = 0
-        effective_page_size = min(page_size, 100)
+        effective_page_size = min(page_size, MARKETS_PAGE_LIMIT)
+        
+        def page_limit(fetched):
+            # Never ask for more than the markets still wanted, so large pages don't overshoot max_total
+            return effective_page_size if max_total is None else max(1, min(effective_page_size, max_total - fetched))
 
         consecutive_errors = 0
         max_consecutive_errors = 10  # Allow more errors before giving up
@@ -57,160 +342,187 @@ class BasicMM:
 
         while True:
             try:
-                params = {"limit": effective_page_size}
+                params = {"limit": page_limit(market_count)}
                 if status is not None:
                     params["status"] = status
                 if cursor:
                     params["cursor"] = cursor
 
-                # Try using SDK first
-                try:
-                    response = self.client.get_markets(**params)
-                    consecutive_errors = 0  # Reset error counter on success
+                # Try using SDK first (skipped once it has failed validation and pages come over raw HTTP)
+                api_error = None
+                if prefetched_raw is None:
+                    try:
+                        if prefetched is not None:
+                            page, prefetched = prefetched, None
+                            response = page.result()
+                        else:
+                            response = self.client.get_markets(**params)
+                        consecutive_errors = 0  # Reset error counter on success
 
-                    if hasattr(response, 'markets') and response.markets:
-                        all_markets.extend(response.markets)
-                        page_count += 1
-                        # Print progress every 10 pages
-                        if page_count % 10 == 0:
-                            print(f"Fetched {len(all_markets)} markets so far (page {page_count}, {skipped_markets} markets skipped due to errors)...")
+                        if hasattr(response, 'markets') and response.markets:
+                            # Get cursor for next page, and request that page before processing this one
+                            next_cursor = response.cursor if hasattr(response, 'cursor') else None
+                            if next_cursor and (max_total is None or market_count + len(response.markets) < max_total):
+                                prefetched = prefetcher.submit(self.client.get_markets, **dict(
+                                    params, cursor=next_cursor, limit=page_limit(market_count + len(response.markets))))
+                        
+                            page = list(map(project, response.markets))
+                            all_markets[market_count:market_count + len(page)] = page
+                            market_count += len(page)
+                            page_count += 1
+                            # Print progress every 10 pages
+                            if page_count % 10 == 0:
+                                progress(f"Fetched {market_count} markets so far (page {page_count}, {skipped_markets} markets skipped due to errors)...")
                     
-                        # Get cursor for next page
-                        if hasattr(response, 'cursor') and response.cursor:
-                            cursor = response.cursor
-                            self.last_cursor = cursor
+                            if next_cursor:
+                                cursor = next_cursor
+                                last_cursor = cursor
+                            else:
+                                last_cursor = None
+                                break
                         else:
-                            self.last_cursor = None
+                            # No more markets
+                            last_cursor = None
                             break
-                    else:
-                        # No more markets
-                        self.last_cursor = None
-                        break
 
-                except Exception as api_error:
-                    # Handle validation errors from API (e.g., invalid market statuses like 'inactive')
-                    error_str = str(api_error)
-                    if "validation error" in error_str.lower() or "must be one of enum values" in error_str.lower():
+                    except Exception as e:
+                        # Handle validation errors from API (e.g., invalid market statuses like 'inactive')
+                        error_str = str(e)
+                        if "validation error" not in error_str.lower() and "must be one of enum values" not in error_str.lower():
+                            # Re-raise if it's a different type of error
+                            raise
+                        api_error = e
+                
+                if api_error is not None or prefetched_raw is not None:
+                    if api_error is not None:
                         consecutive_errors += 1
-                        print(f"Warning: Validation error on page {page_count + 1} (invalid market data). Using raw HTTP to extract cursor and continue...")
+                        progress(f"Warning: Validation error on page {page_count + 1} (invalid market data). Using raw HTTP to extract cursor and continue...")
                         
                         if consecutive_errors >= max_consecutive_errors:
                             print(f"Too many consecutive validation errors ({consecutive_errors}). Stopping pagination.")
                             break
+                    
+                    # Use raw HTTP request to get JSON and extract cursor, then filter invalid markets
+                    try:
+                        # Build URL for raw HTTP request
+                        url = f"{base_url}/markets"
+                        headers = {}
+                        
+                        # Add authentication if available
+                        if hasattr(config, 'api_key_id') and config.api_key_id:
+                            # Kalshi API might need auth headers - check if needed
+                            pass
+                        
+                        http_params = {"limit": page_limit(market_count)}
+                        if status is not None:
+                            http_params["status"] = status
+                        if cursor:
+                            http_params["cursor"] = cursor
+                        
+                        # Make raw HTTP request (or take the one prefetched with the previous raw page)
+                        if prefetched_raw is not None:
+                            page, prefetched_raw = prefetched_raw, None
+                            http_response = page.result()
+                        else:
+                            http_response = self.http_session.get(url, params=http_params, headers=headers, timeout=30)
+                        http_response.raise_for_status()
+                        raw_data = orjson.loads(http_response.content) if orjson is not None else http_response.json()
+                        
+                        # Extract cursor from raw response (the last page has none, but its markets are still kept)
+                        next_cursor = raw_data.get('cursor') or None
+                        last_cursor = next_cursor
+                        if next_cursor:
+                            cursor = next_cursor
+                        
+                        # Request the next page before deserializing this one, so the
+                        # Market.from_dict calls below overlap the next round trip. It stays on raw HTTP:
+                        # the SDK just failed to validate this listing and would likely fail again
+                        if next_cursor and (max_total is None or market_count + len(raw_data.get('markets') or ()) < max_total):
+                            prefetched_raw = prefetcher.submit(self.http_session.get, url, headers=headers, timeout=30, params=dict(
+                                http_params, cursor=cursor, limit=page_limit(market_count + len(raw_data.get('markets') or ()))))
 
-                        # Use raw HTTP request to get JSON and extract cursor, then filter invalid markets
-                        try:
-                            # Build URL for raw HTTP request
-                            url = f"{base_url}/markets"
-                            headers = {}
+                        # Try to parse markets from raw data, filtering out invalid ones
+                        if 'markets' in raw_data and raw_data['markets']:
+                            valid_statuses = {'initialized', 'active', 'closed', 'settled', 'determined'}
+                            valid_markets_count = 0
                             
-                            # Add authentication if available
-                            if hasattr(config, 'api_key_id') and config.api_key_id:
-                                # Kalshi API might need auth headers - check if needed
-                                pass
-                            
-                            http_params = {"limit": effective_page_size}
-                            if status is not None:
-                                http_params["status"] = status
-                            if cursor:
-                                http_params["cursor"] = cursor
+                            for market_data in raw_data['markets']:
+                                # Check if market has valid status before trying to deserialize
+                                market_status = market_data.get('status', '')
+                                if market_status not in valid_statuses:
+                                    skipped_markets += 1
+                                    continue
+                                
+                                # Try to create market object from valid data
+                                try:
+                                    # Use SDK to create market object from dict
+                                    from kalshi_python.models.market import Market
+                                    market = Market.from_dict(market_data)
+                                    all_markets[market_count:market_count + 1] = [project(market)]
+                                    market_count += 1
+                                    valid_markets_count += 1
+                                except Exception as market_error:
+                                    skipped_markets += 1
+                                    continue
                             
-                            # Make raw HTTP request
-                            http_response = requests.get(url, params=http_params, headers=headers, timeout=30)
-                            http_response.raise_for_status()
-                            raw_data = http_response.json()
+                            if valid_markets_count > 0:
+                                page_count += 1
+                                if page_count % 10 == 0:
+                                    progress(f"Fetched {market_count} markets so far (page {page_count}, {skipped_markets} markets skipped due to errors)...")
                             
-                            # Extract cursor from raw response
-                            if 'cursor' in raw_data and raw_data['cursor']:
-                                cursor = raw_data['cursor']
-                                self.last_cursor = cursor
-                            else:
-                                self.last_cursor = None
+                            if not next_cursor:
                                 break
-
-                            # Try to parse markets from raw data, filtering out invalid ones
-                            if 'markets' in raw_data and raw_data['markets']:
-                                valid_statuses = {'initialized', 'active', 'closed', 'settled', 'determined'}
-                                valid_markets_count = 0
-                                
-                                for market_data in raw_data['markets']:
-                                    # Check if market has valid status before trying to deserialize
-                                    market_status = market_data.get('status', '')
-                                    if market_status not in valid_statuses:
-                                        skipped_markets += 1
-                                        continue
-                                    
-                                    # Try to create market object from valid data
-                                    try:
-                                        # Use SDK to create market object from dict
-                                        from kalshi_python.models.market import Market
-                                        market = Market.from_dict(market_data)
-                                        all_markets.append(market)
-                                        valid_markets_count += 1
-                                    except Exception as market_error:
-                                        skipped_markets += 1
-                                        continue
-                                
-                                if valid_markets_count > 0:
-                                    page_count += 1
-                                    if page_count % 10 == 0:
-                                        print(f"Fetched {len(all_markets)} markets so far (page {page_count}, {skipped_markets} markets skipped due to errors)...")
-                                
-                                # Continue to next iteration with updated cursor
-                                continue
-                            else:
-                                # No more markets
-                                self.last_cursor = None
-                                break
-
-                        except Exception as http_error:
-                            print(f"Raw HTTP request also failed: {http_error}")
-                            # Can't continue without cursor
+                        else:
+                            # No more markets
+                            last_cursor = None
                             break
-                    else:
-                        # Re-raise if it's a different type of error
-                        raise
+
+                    except Exception as http_error:
+                        print(f"Raw HTTP request also failed: {http_error}")
+                        # Can't continue without cursor
+                        break
 
                 # Stop if we've reached the requested total (unless max_total is None, meaning fetch all)
-                if max_total is not None and len(all_markets) >= max_total:
-                    print(f"Reached requested limit of {max_total} markets")
+                if max_total is not None and market_count >= max_total:
+                    progress(f"Reached requested limit of {max_total} markets")
                     break
 
             except Exception as e:
                 print(f"Error fetching markets on page {page_count + 1}: {e}")
-                import traceback
                 traceback.print_exc()
                 # Fallback: single request without pagination
                 try:
-                    fallback_params = {"limit": min(page_size, 100)}
+                    fallback_params = {"limit": page_limit(market_count)}
                     if status is not None:
                         fallback_params["status"] = status
                     if cursor:
                         fallback_params["cursor"] = cursor
                     response = self.client.get_markets(**fallback_params)
                     if hasattr(response, 'markets') and response.markets:
-                        all_markets.extend(response.markets)
+                        page = list(map(project, response.markets))
+                        all_markets[market_count:market_count + len(page)] = page
+                        market_count += len(page)
                         # Update cursor if available
                         if hasattr(response, 'cursor') and response.cursor:
-                            self.last_cursor = response.cursor
+                            last_cursor = response.cursor
                 except Exception as fallback_error:
                     print(f"Fallback also failed: {fallback_error}")
                 break
+        prefetcher.shutdown(wait=False)
+        del all_markets[market_count:]
 
         if max_total is None:
-            print(f"Successfully fetched ALL {len(all_markets)} available markets from Kalshi")
+            progress(f"Successfully fetched ALL {len(all_markets)} available markets from Kalshi")
         else:
-            print(f"Successfully fetched {len(all_markets)} valid markets")
-        if self.last_cursor:
-            print(f"Last cursor stored. Use get_next_markets() to continue from here.")
-
-        class MarketResponse:
-            def __init__(self, markets):
-                self.markets = markets
+            progress(f"Successfully fetched {len(all_markets)} valid markets")
+        if track_cursor:
+            self.last_cursor = last_cursor
+            if last_cursor:
+                progress(f"Last cursor stored. Use get_next_markets() to continue from here.")
 
         return MarketResponse(all_markets)
     
-    def get_next_markets(self, max_total=10000, page_size=100, status="open"):
+    def get_next_markets(self, max_total=10000, page_size=MARKETS_PAGE_LIMIT, status="open"):
         """
         Get the next batch of markets continuing from the last cursor.
         This is useful when you've already fetched markets and want to continue.
@@ -238,14 +550,13 @@ class BasicMM:
     def get_market_trades(self, market_id):
         return self.client.get_market_trades(market_id)
     
+    def get_market_spread_by_ticker(self, ticker):
+        """Get the spread for a market ticker. Returns 0 if not found."""
+        return self.market_spreads.get(ticker, 0)
+
     def get_market_spread(self, market):
-        """Get the spread for a market object. Returns 0 if not found."""
-        if isinstance(market, str):
-            # If market is a ticker string
-            return self.market_spreads.get(market, 0)
-        else:
-            # If market is a market object
-            return self.market_spreads.get(market.ticker, 0)
+        """Get the spread for a market object (or ticker string). Returns 0 if not found."""
+        return self.market_spreads.get(getattr(market, 'ticker', market), 0)
 
     def calculate_remaining_balance(self):
         try:
@@ -260,109 +571,139 @@ class BasicMM:
             print(f"Error getting balance: {e}")
             return 0  # Return 0 if we can't get balance
 
-    def identify_market_opportunities(self, max_total=100000, continue_from_last=False):
+    def identify_market_opportunities(self, max_total=100000, continue_from_last=False, write_csv=True, top_k=None):
         """
         Identify market opportunities from fetched markets.
         
         Args:
             max_total: Maximum number of markets to fetch and analyze. If None, fetches all available markets.
             continue_from_last: If True, continue from last cursor instead of starting from beginning
+            write_csv: If True, save the opportunities to data/marketData (skip in tight loops)
+            top_k: If given, only the top_k widest spreads are ranked and kept in market_opportunities
+                   (partial selection instead of sorting every opportunity); the CSV still lists all of them
         """
         start_time = time.perf_counter()
         
         if continue_from_last:
             print("Continuing from last cursor position...")
-            markets_response = self.get_next_markets(max_total=max_total, page_size=100, status="open")
+            markets_response = self.get_next_markets(max_total=max_total, page_size=MARKETS_PAGE_LIMIT, status="open")
         else:
             if max_total is None:
                 print("Fetching ALL available markets from Kalshi (this may take a while)...")
-        markets_response = self.get_markets(max_total=max_total, page_size=100, status="open")
+        markets_response = self.get_markets(max_total=max_total, page_size=MARKETS_PAGE_LIMIT, status="open")
         
         markets = markets_response.markets if hasattr(markets_response, 'markets') else markets_response
-        opportunities = []  # Will store tuples of (market, spread)
-        market_spreads = {}  # Dictionary to map market ticker to spread for easy access
         
         print(f"Analyzing {len(markets)} markets for opportunities...")
         
-        for market in markets:
-            # Calculate spread from bid/ask prices
-            spread = 0
-            if hasattr(market, 'yes_bid') and hasattr(market, 'yes_ask') and market.yes_bid is not None and market.yes_ask is not None:
-                # Prices might be in cents (0-100) or probability (0-1)
-                # Convert to probability format for consistency
-                if market.yes_bid > 1 or market.yes_ask > 1:
-                    # Prices are in cents, convert to probability
-                    spread = (market.yes_ask - market.yes_bid) / 100.0
-                else:
-                    # Prices are already in probability format
-                    spread = market.yes_ask - market.yes_bid
-            
-            volume = getattr(market, 'volume', 0) or 0
-            if spread > 0.03 and volume > 1000:
-                opportunities.append((market, spread))
-                market_spreads[market.ticker] = spread
+        # Struct-of-arrays view of the markets so the spread/volume filter runs as a few array ops
+        # (missing prices become NaN, which fails every comparison below)
+        # (one attrgetter call per market, transposed so each column is its own contiguous array)
+        bids, asks, volumes = zip(*map(_quote_fields, markets)) if markets else ((), (), ())
+        yes_bid = np.array(bids, dtype=np.float64)
+        yes_ask = np.array(asks, dtype=np.float64)
+        volume = np.nan_to_num(np.array(volumes, dtype=np.float64))
+        
+        # Prices might be in cents (0-100) or probability (0-1)
+        # Convert to probability format for consistency, and keep markets above the spread/volume thresholds
+        if _scan_opportunities is not None:
+            idx = np.empty(len(markets), dtype=np.int64)
+            kept = np.empty(len(markets), dtype=np.float64)
+            n = _scan_opportunities(yes_bid, yes_ask, volume, OPPORTUNITY_MIN_SPREAD, OPPORTUNITY_MIN_VOLUME, idx, kept)
+            idx, kept = idx[:n], kept[:n]
+        else:
+            spread = _opportunity_spread(yes_bid, yes_ask)
+            idx = np.flatnonzero((spread > OPPORTUNITY_MIN_SPREAD) & (volume > OPPORTUNITY_MIN_VOLUME))
+            kept = spread[idx]
         
-        # Sort opportunities by spread (highest first)
-        opportunities.sort(key=lambda x: x[1], reverse=True)
+        rest = np.empty(0, dtype=np.int64)  # Positions in idx/kept outside the top_k (only written to the CSV, unranked)
+        if top_k is not None and top_k < len(kept):
+            # Select the top_k in O(n): everything above the k-th largest spread, then the earliest ties at it
+            kth = np.partition(kept, len(kept) - top_k)[len(kept) - top_k]
+            above = kept > kth
+            ties = np.flatnonzero(kept == kth)[:top_k - np.count_nonzero(above)]
+            selected = above
+            selected[ties] = True
+            top = np.flatnonzero(selected)
+            rest = np.flatnonzero(~selected)
+        else:
+            top = np.arange(len(kept))
+        
+        # Sort by spread (highest first, stable)
+        order = top[np.argsort(-kept[top], kind='stable')]
+        ranked_spreads = kept[order].tolist()
         # Store as list of markets (spread is accessible via market_spreads dict)
-        self.market_opportunities = [market for market, _ in opportunities]
-        self.market_spreads = market_spreads  # Store spreads for later access
+        self.market_opportunities = [markets[i] for i in idx[order].tolist()]
+        tickers = [market.ticker for market in self.market_opportunities]
+        self.market_spreads = dict(zip(tickers, ranked_spreads))  # Store spreads for later access
+        # Index the opportunities so get_price/trade don't need a REST call (or a list scan) per market
+        self.market_index = dict(zip(tickers, self.market_opportunities))
+        self.market_prices = {ticker: (market.yes_bid, market.yes_ask) for ticker, market in zip(tickers, self.market_opportunities)}
+        # Keep the opportunities' columns (in ranked order) so filter_market_opportunities doesn't re-read them
+        ranked = idx[order]
+        self._opportunity_columns = (self.market_opportunities, yes_bid[ranked], yes_ask[ranked], volume[ranked],
+                                     kept[order])
+        opportunity_count = len(order) + len(rest)
         
-        if len(opportunities) == 0:
-            print("No opportunities found with spreads > 0.03")
+        if opportunity_count == 0:
+            print(f"No opportunities found with spreads > {OPPORTUNITY_MIN_SPREAD}")
             print("This is normal when markets have no active trading or tight spreads")
         else:
-            print(f"Found {len(opportunities)} opportunities with spreads > 0.03")
+            print(f"Found {opportunity_count} opportunities with spreads > {OPPORTUNITY_MIN_SPREAD}")
 
         elapsed = time.perf_counter() - start_time
         print(f"identify_market_opportunities completed in {elapsed:.3f} seconds")
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "marketData")
-        os.makedirs(log_dir, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_file = os.path.join(log_dir, f"marketData_{timestamp}.csv")
-        
-        # Write CSV file with headers
-        with open(csv_file, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            
-            writer.writerow([
-                "timestamp",
-                "ticker",
-                "title",
-                "spread",
-                "yes_bid",
-                "yes_ask",
-                "no_bid",
-                "no_ask",
-                "volume",
-                "volume_24h",
-                "last_price",
-                "status",
-                "close_time",
-                "event_ticker"
-            ])
-            
-            # Write data rows
-            current_timestamp = datetime.datetime.now().isoformat()
-            for market, spread in opportunities:
-                writer.writerow([
-                    current_timestamp,
-                    market.ticker,
-                    getattr(market, 'title', ''),
-                    spread,
-                    getattr(market, 'yes_bid', None) or '',
-                    getattr(market, 'yes_ask', None) or '',
-                    getattr(market, 'no_bid', None) or '',
-                    getattr(market, 'no_ask', None) or '',
-                    getattr(market, 'volume', 0) or 0,
-                    getattr(market, 'volume_24h', 0) or 0,
-                    getattr(market, 'last_price', None) or '',
-                    getattr(market, 'status', ''),
-                    str(getattr(market, 'close_time', '')) if hasattr(market, 'close_time') else '',
-                    getattr(market, 'event_ticker', '') or ''
-                ])
-        
-        print(f"Market opportunities saved to: {csv_file}")
+        if not write_csv:
+            return
+        
+        # (market, spread) rows for the CSV: the ranked opportunities, then any outside the top_k
+        opportunities = list(zip(self.market_opportunities, ranked_spreads))
+        opportunities.extend((markets[i], market_spread) for i, market_spread in zip(idx[rest].tolist(), kept[rest].tolist()))
+        
+        # Skip the CSV when the opportunity set is unchanged since the last one written
+        fingerprint = hash(tuple((market.ticker, spread, market.volume) for market, spread in opportunities))
+        if fingerprint == self._last_csv_fingerprint:
+            print("Market opportunities unchanged since last CSV, skipping write")
+            return
+        self._last_csv_fingerprint = fingerprint
+        
+        now = datetime.datetime.now()
+        csv_file = os.path.join(self._market_data_dir, f"marketData_{now.strftime('%Y%m%d_%H%M%S')}.csv")
+        
+        # Build the CSV (headers + rows) in memory, then write it with a single call
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        
+        writer.writerow(OPPORTUNITY_CSV_HEADER)
+        
+        # Write all data rows in one call (one attrgetter call per market for its columns)
+        current_timestamp = now.isoformat()
+        writer.writerows(
+            (
+                current_timestamp,
+                ticker,
+                title,
+                spread,
+                yes_bid or '',
+                yes_ask or '',
+                no_bid or '',
+                no_ask or '',
+                volume or 0,
+                volume_24h or 0,
+                last_price or '',
+                status,
+                str(close_time),
+                event_ticker or ''
+            )
+            for (ticker, title, yes_bid, yes_ask, no_bid, no_ask, volume, volume_24h, last_price, status,
+                 close_time, event_ticker), spread in ((_csv_fields(market), spread) for market, spread in opportunities)
+        )
+        
+        # Encode/write/fsync on a background thread so the caller (e.g. trading) isn't held up by the disk
+        if self._csv_executor is None:
+            self._csv_executor = ThreadPoolExecutor(max_workers=1)
+        self.csv_future = self._csv_executor.submit(_write_csv_atomic, csv_file, buffer.getvalue())
+
 
     # get buy and sell prices for a market
     def get_price(self, marketID):
@@ -376,16 +717,24 @@ class BasicMM:
         Returns:
             Tuple of (buy_price_cents, sell_price_cents) both in range 1-99, or (None, None) on error
         """
+        # Markets from the last identify_market_opportunities already have clean (bid, ask) pairs
+        known_prices = self.market_prices.get(marketID)
+        if known_prices is not None:
+            return self.quote_prices(marketID, *known_prices)
+        
         try:
-            # First, try to get the market from our cached opportunities if available
+            # First, try to get the market from our cached opportunities or the live market book
             # This ensures we use the same market object that has the data
-            market = None
-            if hasattr(self, 'market_opportunities') and self.market_opportunities:
-                for m in self.market_opportunities:
-                    market_ticker = getattr(m, 'ticker', None) or (m if isinstance(m, str) else None)
-                    if market_ticker == marketID:
-                        market = m
-                        break
+            market = self.market_index.get(marketID)
+            if market is None and self.market_book is not None:
+                market = self.market_book.markets.get(marketID)
+            
+            # Then a market get_price fetched itself within the last FETCHED_MARKET_TTL seconds
+            if market is None:
+                cached = self._fetched_markets.get(marketID)
+                if cached is not None and time.monotonic() - cached[0] < FETCHED_MARKET_TTL:
+                    self._fetched_markets.move_to_end(marketID)
+                    market = cached[1]
             
             # If not found in cache, fetch from API
             if market is None:
@@ -402,16 +751,22 @@ class BasicMM:
                 else:
                     print(f"Error: Unexpected market response format for {marketID}")
                     return None, None
+                
+                self._fetched_markets[marketID] = (time.monotonic(), market)
+                self._fetched_markets.move_to_end(marketID)
+                if len(self._fetched_markets) > FETCHED_MARKET_CACHE_SIZE:
+                    self._fetched_markets.popitem(last=False)
             
             # Debug: Print what we actually got
-            print(f"DEBUG get_price for {marketID}:")
-            print(f"  Market type: {type(market)}")
-            print(f"  Has yes_bid attr: {hasattr(market, 'yes_bid')}")
-            print(f"  Has yes_ask attr: {hasattr(market, 'yes_ask')}")
-            if hasattr(market, 'yes_bid'):
-                print(f"  yes_bid value: {market.yes_bid} (type: {type(market.yes_bid)})")
-            if hasattr(market, 'yes_ask'):
-                print(f"  yes_ask value: {market.yes_ask} (type: {type(market.yes_ask)})")
+            if self.debug:
+                print(f"DEBUG get_price for {marketID}:")
+                print(f"  Market type: {type(market)}")
+                print(f"  Has yes_bid attr: {hasattr(market, 'yes_bid')}")
+                print(f"  Has yes_ask attr: {hasattr(market, 'yes_ask')}")
+                if hasattr(market, 'yes_bid'):
+                    print(f"  yes_bid value: {market.yes_bid} (type: {type(market.yes_bid)})")
+                if hasattr(market, 'yes_ask'):
+                    print(f"  yes_ask value: {market.yes_ask} (type: {type(market.yes_ask)})")
             
             # Try to get values - use the same pattern that works in identify_market_opportunities
             yes_bid = None
@@ -437,12 +792,12 @@ class BasicMM:
             if yes_ask is None and isinstance(market, dict):
                 yes_ask = market.get('yes_ask')
             
-            print(f"  Final yes_bid: {yes_bid}, yes_ask: {yes_ask}")
+            if self.debug:
+                print(f"  Final yes_bid: {yes_bid}, yes_ask: {yes_ask}")
             
             # Handle case where values might be 0 (falsy but not None)
             # 0 is not a valid price, so treat it as missing data
-            if yes_bid is None or yes_ask is None or yes_bid == 0 or yes_ask == 0:
-                print(f"Warning: No bid/ask prices available for market {marketID} (yes_bid={yes_bid}, yes_ask={yes_ask})")
+            if self.debug and (yes_bid is None or yes_ask is None or yes_bid == 0 or yes_ask == 0):
                 # Print all non-callable attributes for debugging
                 print(f"  All market attributes:")
                 for attr in dir(market):
@@ -452,6 +807,30 @@ class BasicMM:
                             print(f"    {attr} = {value}")
                         except:
                             pass
+            
+            return self.quote_prices(marketID, yes_bid, yes_ask)
+            
+        except Exception as e:
+            print(f"Error in get_price for market {marketID}: {e}")
+            traceback.print_exc()
+            return None, None
+
+    def quote_prices(self, marketID, yes_bid, yes_ask):
+        """
+        Turn a market's current yes bid/ask into buy and sell prices (the pricing half of get_price).
+        
+        Args:
+            marketID: Market ticker ID string (for messages)
+            yes_bid: Current best yes bid
+            yes_ask: Current best yes ask
+            
+        Returns:
+            Tuple of (buy_price_cents, sell_price_cents) both in range 1-99, or (None, None) on error
+        """
+        try:
+            # 0 is not a valid price, so treat it as missing data
+            if yes_bid is None or yes_ask is None or yes_bid == 0 or yes_ask == 0:
+                print(f"Warning: No bid/ask prices available for market {marketID} (yes_bid={yes_bid}, yes_ask={yes_ask})")
                 return None, None
 
             # Convert to integers (prices are typically in cents, 0-100 range)
@@ -474,67 +853,240 @@ class BasicMM:
             sell_price_cents = base_sell_price - 1
             
             # Ensure prices are within valid range (1-99 cents) for the API
-            buy_price_cents = max(1, min(99, buy_price_cents))
-            sell_price_cents = max(1, min(99, sell_price_cents))
+            # (bases are 0-100, so bid + 1 can only overshoot 99 and ask - 1 can only undershoot 1)
+            if buy_price_cents > 99:
+                buy_price_cents = 99
+            if sell_price_cents < 1:
+                sell_price_cents = 1
             
             # Ensure we don't cross the spread (buy price should be < sell price)
             if buy_price_cents >= sell_price_cents:
-                # If prices would cross, use the mid-price approach
+                # If prices would cross, use the mid-price approach (mid is 0-100, clamped as above)
                 mid_price = (base_buy_price + base_sell_price) // 2
-                buy_price_cents = max(1, min(99, mid_price - 1))
-                sell_price_cents = max(1, min(99, mid_price + 1))
+                buy_price_cents = mid_price - 1 if mid_price > 1 else 1
+                sell_price_cents = mid_price + 1 if mid_price < 99 else 99
                 # Ensure buy < sell
                 if buy_price_cents >= sell_price_cents:
-                    buy_price_cents = max(1, sell_price_cents - 1)
+                    buy_price_cents = sell_price_cents - 1 if sell_price_cents > 2 else 1
             
             return buy_price_cents, sell_price_cents
             
         except Exception as e:
-            print(f"Error in get_price for market {marketID}: {e}")
-            import traceback
+            print(f"Error in quote_prices for market {marketID}: {e}")
             traceback.print_exc()
             return None, None
 
+    def _wait_for_order(self, future, market_id, action, log=print):
+        """Wait for a submitted create_order call (messages go to log). Returns (order, order_id), or (None, None) if it failed."""
+        try:
+            order = future.result()
+        except Exception as e:
+            log(f"✗ Error creating {action} order for {market_id}: {e}")
+            if self.debug:
+                log(traceback.format_exc().rstrip())
+            return None, None
+        if not order:
+            log(f"⚠ {action.capitalize()} order returned None for {market_id}")
+            return None, None
+        
+        order_id = _order_id(order)
+        if order_id:
+            log(f"  {action.capitalize()} order ID: {order_id}")
+        elif self.debug:
+            # Debug: print order object structure
+            log(f"  Order object type: {type(order)}")
+            if hasattr(order, '__dict__'):
+                log(f"  Order attributes: {list(order.__dict__.keys())}")
+        return order, order_id
+
+    def _rate_limited(self, call, *args, **kwargs):
+        """Make one order write (create/cancel) once the order rate limiter allows it."""
+        self.order_rate_limiter.acquire()
+        return call(*args, **kwargs)
+
+    def _create_order_batch(self, legs):
+        """
+        Submit order legs (for up to BATCH_ORDERS_MAX_MARKETS markets) in one batched create-orders
+        request, resolving each leg's future with its order (or error). Falls back to one
+        create_order call per leg only when the batch is known not to have placed anything:
+        the endpoint was refused (401/403/404/405), the batch was rate limited (429, after backing off)
+        or the connection failed before sending.
+        Any other failure (timeout, 5xx, unreadable response) may have placed orders, so the
+        legs' futures fail instead of the orders being sent again.
+        
+        Args:
+            legs: List of (create_order arguments, Future) pairs, in request order
+        """
+        results = None
+        error = Exception("order leg was not resolved")  # For any future left unresolved
+        try:
+            if self._batch_orders_supported:
+                try:
+                    host = self.client.api_client.configuration.host
+                    headers = KalshiAPI().auth_headers("POST", urlparse(host).path + BATCH_ORDERS_PATH, demo=self.demo)
+                    self.order_rate_limiter.acquire(len(legs))  # Each order in a batch counts as a write
+                    response = self.http_session.post(f"{host}{BATCH_ORDERS_PATH}", json={"orders": [leg for leg, _ in legs]},
+                                                      headers=headers, timeout=30)
+                except requests.exceptions.RequestException as e:
+                    if not _request_not_sent(e):
+                        raise
+                    print(f"Batched orders could not connect ({e}), submitting order legs separately")
+                else:
+                    if response.status_code in (401, 403, 404, 405):
+                        self._batch_orders_supported = False
+                        print(f"Batched orders unavailable (HTTP {response.status_code}), submitting order legs separately")
+                    elif response.status_code == 429:
+                        try:
+                            delay = float(response.headers.get("Retry-After", BATCH_ORDERS_RATE_LIMITED_DELAY))
+                        except ValueError:
+                            delay = BATCH_ORDERS_RATE_LIMITED_DELAY
+                        print(f"Batched orders rate limited (HTTP 429), submitting order legs separately in {delay:g}s")
+                        time.sleep(delay)
+                    else:
+                        response.raise_for_status()
+                        results = (orjson.loads(response.content) if orjson is not None else response.json()).get("orders", [])
+            
+            for i, (leg, future) in enumerate(legs):
+                try:
+                    if results is None:
+                        future.set_result(self._rate_limited(self.client.create_order, **leg))
+                        continue
+                    result = results[i] if i < len(results) else {}
+                    if result.get("order"):
+                        future.set_result(types.SimpleNamespace(**result["order"]))
+                    else:
+                        leg_error = result.get("error") or {}
+                        future.set_exception(Exception(f"{leg_error.get('code', 'unknown_error')}: {leg_error.get('message', 'no order returned')}"))
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+        except Exception as e:
+            print(f"Batched orders failed ({e}), not re-sending: some of its {len(legs)} orders may have been placed")
+            error = e
+        finally:
+            # Never leave a leg's future pending, trade() blocks on every one of them
+            for _, future in legs:
+                if not future.done():
+                    future.set_exception(error)
+
+    def close(self):
+        """Flush and close the trade log, wait for any pending CSV write, and stop the market book."""
+        if self._trade_log_fh is not None:
+            self._trade_log_fh.close()
+            self._trade_log_fh = None
+        if self._csv_executor is not None:
+            self._csv_executor.shutdown(wait=True)
+            self._csv_executor = None
+        if self.market_book is not None:
+            self.market_book.stop()
+
+    def __del__(self):
+        # _trade_log_fh may not exist if __init__ failed before setting it
+        if getattr(self, '_trade_log_fh', None) is not None:
+            self._trade_log_fh.close()
+
+    def _trade_log(self):
+        """
+        Return the open handle on this session's trade log (logs/trade_logs/tradeLimitOrders_<session start>.log).
+        The file is opened once (in binary append mode) and reused by every trade() call instead of being reopened per market.
+        """
+        if self._trade_log_fh is None:
+            self._trade_log_fh = open(self._trade_log_path, "ab", buffering=1 << 16)
+        return self._trade_log_fh
+
 # executes market making trades for all markets in market_id_list.  Bankroll is the amount of money to be used.
-    def trade(self, market_id_list, bankroll, stop_loss=0): 
-        print("--- WARNING: trading with actual money ---")
-        print(f"\n{'='*80}")
-        print(f"TRADING SESSION STARTED")
-        print(f"{'='*80}")
-        print(f"Total markets to process: {len(market_id_list)}")
-        print(f"Starting bankroll: ${bankroll/100:.2f}")
+    def trade(self, market_id_list, bankroll, stop_loss=0, prices=None): 
+        """
+        Args:
+            market_id_list: Market objects or ticker strings to trade
+            bankroll: Amount of money to use (cents)
+            stop_loss: Stop loss distance in cents (0 disables stop loss files)
+            prices: Optional {ticker: (yes_bid, yes_ask)} already known (e.g. self.market_prices),
+                    so no market data is fetched for those markets before ordering
+        
+        Returns:
+            Bankroll left after the orders placed (cents)
+        """
+        # Output is collected per phase and written with one print, instead of a print per line
+        report = []
+        log = report.append
+        # Per-market progress lines (prices, sizes, placed orders); dropped unless verbose
+        detail = report.append if self.verbose else (lambda line: None)
+        def flush_report():
+            if report:
+                print("\n".join(report), flush=True)
+                report.clear()
+        
+        log("--- WARNING: trading with actual money ---")
+        log(f"\n{'='*80}")
+        log(f"TRADING SESSION STARTED")
+        log(f"{'='*80}")
+        log(f"Total markets to process: {len(market_id_list)}")
+        log(f"Starting bankroll: ${bankroll/100:.2f}")
         
         # Print list of markets to be traded
-        print(f"\nMarkets to trade:")
-        for i, market in enumerate(market_id_list, 1):
-            market_id = market.ticker if hasattr(market, 'ticker') else market
-            print(f"  {i}. {market_id}")
+        # Handle both market objects and market ID strings (resolved once for the whole session)
+        market_ids = [getattr(market, 'ticker', market) for market in market_id_list]
+        log(f"\nMarkets to trade:")
+        for i, market_id in enumerate(market_ids, 1):
+            log(f"  {i}. {market_id}")
         
-        print(f"{'='*80}\n")
+        log(f"{'='*80}\n")
+        flush_report()
         
         # Track remaining bankroll as we place orders
         remaining_bankroll = bankroll
         successfully_traded_markets = []  # Track markets where both orders were placed
         failed_markets = []  # Track markets that failed
         
+        # Buy and sell legs (and successive markets) are sent concurrently; orders are network-bound
+        order_executor = ThreadPoolExecutor(max_workers=ORDER_CONCURRENCY)
+        pending_orders = []  # (market_id, buy_price_cents, sell_price_cents, contracts, buy_future, sell_future)
+        pending_cancels = []  # (market_id, side, order_id, cancel_future) for surviving legs of failed markets
+        order_batch = []  # (create_order arguments, Future) legs waiting for the next batched request
+        
+        # Quote every market whose prices are already known in one vectorized pass
+        # (anything it can't price falls back to quote_prices/get_price below, with their messages)
+        batch_quotes = {}
+        # Cheapest contract pair among each market and the ones after it (1¢ where the price isn't known yet)
+        cheapest_from = np.ones(len(market_ids), dtype=np.float64)
+        if prices:
+            known = [market_id for market_id in market_ids if market_id in prices]
+            if known:
+                bids, asks = zip(*(prices[market_id] for market_id in known))
+                buy, sell, valid = quote_prices_batch(np.array(bids, dtype=np.float64), np.array(asks, dtype=np.float64))
+                batch_quotes = {market_id: (buy_price, sell_price) for market_id, buy_price, sell_price, ok
+                                in zip(known, buy.tolist(), sell.tolist(), valid.tolist()) if ok}
+                # A pair costs buy + (100 - sell); markets priced at <= 0 are skipped, so never affordable
+                pair_cost = np.array([
+                    (quote[0] + 100 - quote[1]) if quote is not None else 1
+                    for quote in map(batch_quotes.get, market_ids)
+                ], dtype=np.float64)
+                pair_cost[pair_cost <= 0] = np.inf
+                cheapest_from = np.minimum.accumulate(pair_cost[::-1])[::-1]
+        cheapest_from = cheapest_from.tolist()
+        
         for i in range(len(market_id_list)):
-            # Check if we have enough bankroll before processing this market
-            if remaining_bankroll <= 0:
-                print(f"Insufficient bankroll. Stopping after {i} markets. Remaining: ${remaining_bankroll:.2f}")
+            # Stop once the bankroll can't cover a single contract pair in any market left
+            if remaining_bankroll < cheapest_from[i]:
+                log(f"Insufficient bankroll. Stopping after {i} markets ({len(market_ids) - i} left unfunded). Remaining: ${remaining_bankroll/100:.2f}")
                 break
                 
-            market = market_id_list[i]
-            # Handle both market objects and market ID strings
-            market_id = market.ticker if hasattr(market, 'ticker') else market
+            market_id = market_ids[i]
             
             
-            buy_price_cents, sell_price_cents = self.get_price(market_id)
-            sell_price_cents = 100 - sell_price_cents
+            if market_id in batch_quotes:
+                buy_price_cents, sell_price_cents = batch_quotes[market_id]
+            elif prices is not None and market_id in prices:
+                buy_price_cents, sell_price_cents = self.quote_prices(market_id, *prices[market_id])
+            else:
+                buy_price_cents, sell_price_cents = self.get_price(market_id)
             
             # Check if get_price returned None values (error case)
             if buy_price_cents is None or sell_price_cents is None:
-                print(f"Error: Could not get prices for market {market_id}. Skipping this market.")
+                log(f"Error: Could not get prices for market {market_id}. Skipping this market.")
                 continue
+            sell_price_cents = 100 - sell_price_cents
             
             # Note: Prices are stored in probability format (0-1) for logging, but API uses cents (1-99)
             buy_price_prob = buy_price_cents / 100.0
@@ -549,11 +1101,11 @@ class BasicMM:
             # Calculate how many contracts we can afford with the available bankroll
             # Cost per contract pair = buy_price + sell_price (need both for market making)
             cost_per_contract_pair = buy_price_cents + sell_price_cents
-            print(f"Buy price: {buy_price_cents}, Sell price: {sell_price_cents}")
-            print(f"Cost per contract pair: {cost_per_contract_pair}")
+            detail(f"Buy price: {buy_price_cents}, Sell price: {sell_price_cents}")
+            detail(f"Cost per contract pair: {cost_per_contract_pair}")
             
             if cost_per_contract_pair <= 0:
-                print(f"Error: Invalid prices for market {market_id} (buy: {buy_price_cents}¢, sell: {sell_price_cents}¢). Skipping.")
+                log(f"Error: Invalid prices for market {market_id} (buy: {buy_price_cents}¢, sell: {sell_price_cents}¢). Skipping.")
                 continue
             
             # Calculate maximum number of contracts we can afford
@@ -561,7 +1113,7 @@ class BasicMM:
             max_contracts = remaining_bankroll // cost_per_contract_pair
             
             if max_contracts <= 0:
-                print(f"Insufficient bankroll for market {market_id}. Need at least ${cost_per_contract_pair/100:.2f} per contract pair (buy: {buy_price_cents}¢ + sell: {sell_price_cents}¢), have ${remaining_bankroll/100:.2f}")
+                log(f"Insufficient bankroll for market {market_id}. Need at least ${cost_per_contract_pair/100:.2f} per contract pair (buy: {buy_price_cents}¢ + sell: {sell_price_cents}¢), have ${remaining_bankroll/100:.2f}")
                 continue
             
             # Use the maximum number of contracts we can afford
@@ -572,242 +1124,230 @@ class BasicMM:
             sell_order_total_cost = sell_price_cents * contracts_per_order
             total_cost = buy_order_total_cost + sell_order_total_cost
             
-            print(f"Calculated contracts for {market_id}: {contracts_per_order} contracts (cost: ${total_cost/100:.2f}, remaining bankroll: ${remaining_bankroll/100:.2f})")
+            detail(f"Calculated contracts for {market_id}: {contracts_per_order} contracts (cost: ${total_cost/100:.2f}, remaining bankroll: ${remaining_bankroll/100:.2f})")
             
             # API expects yes_price in cents (1-99), not probability format
             # Keep prices in cents as returned by get_price
             
-            # Place buy order (buying yes contracts)
-            if remaining_bankroll >= buy_order_total_cost:
-                try:
-                    buy_order = self.client.create_order(
-                        ticker=market_id,
-                        side="yes",
-                        action="buy",
-                        count=contracts_per_order,
-                        type="limit",
-                        yes_price=buy_price_cents  # API expects cents (1-99), not probability
-                    )
-                    # Subtract from bankroll if order was successfully created
-                    # Total cost = price per contract * number of contracts
-                    if buy_order:
-                        remaining_bankroll -= buy_order_total_cost
-                        # Try to get order ID from various possible attributes
-                        order_id = None
-                        if hasattr(buy_order, 'order_id'):
-                            order_id = buy_order.order_id
-                        elif hasattr(buy_order, 'id'):
-                            order_id = buy_order.id
-                        elif hasattr(buy_order, 'orderId'):
-                            order_id = buy_order.orderId
-                        elif isinstance(buy_order, dict):
-                            order_id = buy_order.get('order_id') or buy_order.get('id') or buy_order.get('orderId')
-                        
-                        print(f"✓ Buy order placed for {market_id}: {contracts_per_order} contracts @ {buy_price_cents}¢ each (total: ${buy_order_total_cost/100:.2f}). Remaining bankroll: ${remaining_bankroll/100:.2f}")
-                        if order_id:
-                            print(f"  Order ID: {order_id}")
-                        else:
-                            # Debug: print order object structure
-                            print(f"  Order object type: {type(buy_order)}")
-                            if hasattr(buy_order, '__dict__'):
-                                print(f"  Order attributes: {list(buy_order.__dict__.keys())}")
-                    else:
-                        print(f"⚠ Buy order returned None for {market_id}")
-                        buy_order = None
-                except Exception as e:
-                    print(f"✗ Error creating buy order for {market_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    buy_order = None
+            # Reserve both legs up front and submit them together (buying yes contracts, and
+            # selling yes = buying no contracts, which also costs money). A leg that fails is refunded below.
+            remaining_bankroll -= total_cost
+            # Every leg carries its own client_order_id, so a leg sent again after a batch that
+            # failed to connect is rejected as a duplicate rather than placed twice
+            buy_leg = dict(ticker=market_id, side="yes", action="buy", count=contracts_per_order,
+                           type="limit", yes_price=buy_price_cents,  # API expects cents (1-99), not probability
+                           client_order_id=str(uuid.uuid4()))
+            sell_leg = dict(ticker=market_id, side="yes", action="sell", count=contracts_per_order,
+                            type="limit", yes_price=100-sell_price_cents,  # API expects cents (1-99), not probability
+                            client_order_id=str(uuid.uuid4()))
+            if self._batch_orders_supported:
+                # Legs of up to BATCH_ORDERS_MAX_MARKETS markets share one batched request; each leg still succeeds or fails on its own
+                buy_future, sell_future = Future(), Future()
+                order_batch += ((buy_leg, buy_future), (sell_leg, sell_future))
+                if len(order_batch) >= 2 * BATCH_ORDERS_MAX_MARKETS:
+                    order_executor.submit(self._create_order_batch, order_batch)
+                    order_batch = []
             else:
-                print(f"Insufficient bankroll for buy order on {market_id}. Need ${buy_order_total_cost/100:.2f} ({contracts_per_order} contracts @ {buy_price_cents}¢ each), have ${remaining_bankroll/100:.2f}")
+                buy_future = order_executor.submit(self._rate_limited, self.client.create_order, **buy_leg)
+                sell_future = order_executor.submit(self._rate_limited, self.client.create_order, **sell_leg)
+            pending_orders.append((market_id, buy_price_cents, sell_price_cents, contracts_per_order, buy_future, sell_future))
+        
+        if order_batch:
+            order_executor.submit(self._create_order_batch, order_batch)
+        flush_report()
+        
+        # Collect order results in market order (orders for later markets keep going out meanwhile)
+        trade_log_entries = []  # Lines for the trade log, written in one call after the results are collected
+        stoploss_entries = []  # Stop loss data for fully placed markets, written after the results are collected
+        if stop_loss > 0:
+            _ensure_dir(STOPLOSS_DIR)
+        for market_id, buy_price_cents, sell_price_cents, contracts_per_order, buy_future, sell_future in pending_orders:
+            buy_order_total_cost = buy_price_cents * contracts_per_order
+            sell_order_total_cost = sell_price_cents * contracts_per_order
             
-            # Place sell order (selling yes = buying no contracts, also costs money)
-            if remaining_bankroll >= sell_order_total_cost:
-                try:
-                    sell_order = self.client.create_order(
-                        ticker=market_id,
-                        side="yes",
-                        action="sell",
-                        count=contracts_per_order,
-                        type="limit",
-                        yes_price=100-sell_price_cents  # API expects cents (1-99), not probability
-                    )
-                    # Subtract from bankroll if order was successfully created
-                    # Total cost = price per contract * number of contracts
-                    if sell_order:
-                        remaining_bankroll -= sell_order_total_cost
-                        # Try to get order ID from various possible attributes
-                        order_id = None
-                        if hasattr(sell_order, 'order_id'):
-                            order_id = sell_order.order_id
-                        elif hasattr(sell_order, 'id'):
-                            order_id = sell_order.id
-                        elif hasattr(sell_order, 'orderId'):
-                            order_id = sell_order.orderId
-                        elif isinstance(sell_order, dict):
-                            order_id = sell_order.get('order_id') or sell_order.get('id') or sell_order.get('orderId')
-                        
-                        print(f"✓ Sell order placed for {market_id}: {contracts_per_order} contracts @ {sell_price_cents}¢ each (total: ${sell_order_total_cost/100:.2f}). Remaining bankroll: ${remaining_bankroll/100:.2f}")
-                        if order_id:
-                            print(f"  Order ID: {order_id}")
-                        else:
-                            # Debug: print order object structure
-                            print(f"  Order object type: {type(sell_order)}")
-                            if hasattr(sell_order, '__dict__'):
-                                print(f"  Order attributes: {list(sell_order.__dict__.keys())}")
-                    else:
-                        print(f"⚠ Sell order returned None for {market_id}")
-                        sell_order = None
-                except Exception as e:
-                    print(f"✗ Error creating sell order for {market_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    sell_order = None
+            buy_order, buy_order_id = self._wait_for_order(buy_future, market_id, "buy", log)
+            if buy_order:
+                detail(f"✓ Buy order placed for {market_id}: {contracts_per_order} contracts @ {buy_price_cents}¢ each (total: ${buy_order_total_cost/100:.2f}). Remaining bankroll: ${remaining_bankroll/100:.2f}")
             else:
-                print(f"Insufficient bankroll for sell order on {market_id}. Need ${sell_order_total_cost/100:.2f} ({contracts_per_order} contracts @ {sell_price_cents}¢ each), have ${remaining_bankroll/100:.2f}")
-
-            # Log orders
-            # Ensure logs/trade_logs directory exists
-            base_log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
-            trade_logs_dir = os.path.join(base_log_dir, "trade_logs")
-            os.makedirs(trade_logs_dir, exist_ok=True)
-            
-            # Create timestamped log file name (use session start time if available, otherwise current time)
-            if not hasattr(self, '_session_start_time'):
-                self._session_start_time = datetime.datetime.now()
-            file_timestamp = self._session_start_time.strftime("%Y%m%d_%H%M%S")
-            log_file = os.path.join(trade_logs_dir, f"tradeLimitOrders_{file_timestamp}.log")
+                remaining_bankroll += buy_order_total_cost
             
+            sell_order, sell_order_id = self._wait_for_order(sell_future, market_id, "sell", log)
+            if sell_order:
+                detail(f"✓ Sell order placed for {market_id}: {contracts_per_order} contracts @ {sell_price_cents}¢ each (total: ${sell_order_total_cost/100:.2f}). Remaining bankroll: ${remaining_bankroll/100:.2f}")
+            else:
+                remaining_bankroll += sell_order_total_cost
+
             # Log order details (log prices in probability format for consistency with existing logs)
             buy_price_prob = buy_price_cents / 100.0
             sell_price_prob = sell_price_cents / 100.0
-            with open(log_file, "a") as f:
-                entry_timestamp = datetime.datetime.now().isoformat()
-                if buy_order:
-                    buy_order_id = getattr(buy_order, 'order_id', getattr(buy_order, 'id', 'N/A'))
-                    f.write(f"{entry_timestamp}, {market_id}, BUY, {buy_price_prob}, {buy_order_id}\n")
-                if sell_order:
-                    sell_order_id = getattr(sell_order, 'order_id', getattr(sell_order, 'id', 'N/A'))
-                    f.write(f"{entry_timestamp}, {market_id}, SELL, {sell_price_prob}, {sell_order_id}\n")
+            # One clock read per market, shared by its log lines and stop loss file (skipped if nothing was placed)
+            entry_timestamp = datetime.datetime.now().isoformat() if buy_order or sell_order else None
+            if buy_order:
+                trade_log_entries.append(f"{entry_timestamp}, {market_id}, BUY, {buy_price_prob}, {buy_order_id or 'N/A'}\n")
+            if sell_order:
+                trade_log_entries.append(f"{entry_timestamp}, {market_id}, SELL, {sell_price_prob}, {sell_order_id or 'N/A'}\n")
             
             # Check both were created
             if not buy_order or not sell_order:
-                print(f"⚠ Failed to create buy or sell order for market {market_id}")
+                log(f"⚠ Failed to create buy or sell order for market {market_id}")
                 failed_markets.append(market_id)
 
-                # Cancel any partial orders if one failed
-                try:
-                    if buy_order:
-                            order_id = (getattr(buy_order, 'order_id', None) or 
-                                    getattr(buy_order, 'id', None) or 
-                                    getattr(buy_order, 'orderId', None))
-                            if order_id:
-                                self.client.cancel_order(order_id)
-                                print(f"  Cancelled buy order {order_id}")
-                    if sell_order:
-                            order_id = (getattr(sell_order, 'order_id', None) or 
-                                    getattr(sell_order, 'id', None) or 
-                                    getattr(sell_order, 'orderId', None))
-                            if order_id:
-                                self.client.cancel_order(order_id)
-                                print(f"  Cancelled sell order {order_id}")
-                except Exception as cancel_error:
-                    print(f"  Warning: Could not cancel partial orders: {cancel_error}")
+                # Cancel any partial orders if one failed (sent on the order pool, collected after this loop)
+                for side, order_id in (("buy", buy_order_id), ("sell", sell_order_id)):
+                    if order_id:
+                        pending_cancels.append((market_id, side, order_id, order_executor.submit(self._rate_limited, self.client.cancel_order, order_id)))
             else:
                 # Both orders successfully placed
                 successfully_traded_markets.append(market_id)
-                buy_order_id = (getattr(buy_order, 'order_id', None) or 
-                               getattr(buy_order, 'id', None) or 
-                               getattr(buy_order, 'orderId', None) or 'N/A')
-                sell_order_id = (getattr(sell_order, 'order_id', None) or 
-                                getattr(sell_order, 'id', None) or 
-                                getattr(sell_order, 'orderId', None) or 'N/A')
-                print(f"✓ Successfully placed both orders for {market_id}")
-                print(f"  Buy order @ {buy_price_cents}¢: {buy_order_id}")
-                print(f"  Sell order @ {sell_price_cents}¢: {sell_order_id}")
+                detail(f"✓ Successfully placed both orders for {market_id}")
+                detail(f"  Buy order @ {buy_price_cents}¢: {buy_order_id or 'N/A'}")
+                detail(f"  Sell order @ {sell_price_cents}¢: {sell_order_id or 'N/A'}")
                 
                 # Create stop loss file if stop_loss is specified
                 if stop_loss > 0:
-                    try:
-                        # Create Stoploss directory
-                        stoploss_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Stoploss")
-                        os.makedirs(stoploss_dir, exist_ok=True)
-                        
-                        # Calculate stop loss prices
-                        # Buy stop loss: if ask price exceeds (sell_price_cents + stop_loss), buy to cover
-                        # Sell stop loss: if bid price drops below (buy_price_cents - stop_loss), sell to limit loss
-                        buy_stop_loss_price = sell_price_cents + stop_loss
-                        sell_stop_loss_price = buy_price_cents - stop_loss
-                        
-                        # Clamp prices to valid range (1-99)
-                        buy_stop_loss_price = max(1, min(99, buy_stop_loss_price))
-                        sell_stop_loss_price = max(1, min(99, sell_stop_loss_price))
-                        
-                        # Create stop loss data
-                        stoploss_data = {
-                            'market_id': market_id,
-                            'stop_loss_cents': stop_loss,
-                            'buy_price_cents': buy_price_cents,
-                            'sell_price_cents': sell_price_cents,
-                            'buy_stop_loss_price': buy_stop_loss_price,
-                            'sell_stop_loss_price': sell_stop_loss_price,
-                            'contracts': contracts_per_order,
-                            'buy_order_id': buy_order_id if buy_order_id != 'N/A' else None,
-                            'sell_order_id': sell_order_id if sell_order_id != 'N/A' else None,
-                            'created_at': datetime.datetime.now().isoformat(),
-                            'active': True
-                        }
-                        
-                        # Write to file (market name as filename)
-                        stoploss_file = os.path.join(stoploss_dir, f"{market_id}.json")
-                        with open(stoploss_file, 'w') as f:
-                            json.dump(stoploss_data, f, indent=2)
-                        
-                        print(f"✓ Stop loss file created for {market_id}")
-                        print(f"  Buy stop loss trigger: {buy_stop_loss_price}¢ (if ask > {sell_price_cents + stop_loss}¢)")
-                        print(f"  Sell stop loss trigger: {sell_stop_loss_price}¢ (if bid < {buy_price_cents - stop_loss}¢)")
-                    except Exception as e:
-                        print(f"⚠ Error creating stop loss file for {market_id}: {e}")
-                        import traceback
-                        traceback.print_exc()
+                    # Calculate stop loss prices
+                    # Buy stop loss: if ask price exceeds (sell_price_cents + stop_loss), buy to cover
+                    # Sell stop loss: if bid price drops below (buy_price_cents - stop_loss), sell to limit loss
+                    buy_stop_loss_price = sell_price_cents + stop_loss
+                    sell_stop_loss_price = buy_price_cents - stop_loss
+                    
+                    # Clamp prices to valid range (1-99)
+                    buy_stop_loss_price = max(1, min(99, buy_stop_loss_price))
+                    sell_stop_loss_price = max(1, min(99, sell_stop_loss_price))
+                    
+                    # Create stop loss data (files are written together once every result is in)
+                    stoploss_entries.append({
+                        'market_id': market_id,
+                        'stop_loss_cents': stop_loss,
+                        'buy_price_cents': buy_price_cents,
+                        'sell_price_cents': sell_price_cents,
+                        'buy_stop_loss_price': buy_stop_loss_price,
+                        'sell_stop_loss_price': sell_stop_loss_price,
+                        'contracts': contracts_per_order,
+                        'buy_order_id': buy_order_id,
+                        'sell_order_id': sell_order_id,
+                        'created_at': entry_timestamp,
+                        'active': True
+                    })
+                    detail(f"  Buy stop loss trigger: {buy_stop_loss_price}¢ (if ask > {sell_price_cents + stop_loss}¢)")
+                    detail(f"  Sell stop loss trigger: {sell_stop_loss_price}¢ (if bid < {buy_price_cents - stop_loss}¢)")
+        
+        for market_id, side, order_id, cancel_future in pending_cancels:
+            try:
+                cancel_future.result()
+                log(f"  Cancelled {side} order {order_id} ({market_id})")
+            except Exception as cancel_error:
+                log(f"  Warning: Could not cancel partial {side} order {order_id} ({market_id}): {cancel_error}")
+        
+        order_executor.shutdown()
+        _write_stoploss_files(stoploss_entries, detail, log, self.debug)
+        trade_log = self._trade_log()
+        trade_log.write("".join(trade_log_entries).encode("utf-8"))  # One encode and write for the whole session
+        trade_log.flush()
+        flush_report()
         
         # Print summary of trading session
-        print(f"\n{'='*80}")
-        print(f"TRADING SESSION SUMMARY")
-        print(f"{'='*80}")
-        print(f"Successfully traded markets: {len(successfully_traded_markets)}")
+        log(f"\n{'='*80}")
+        log(f"TRADING SESSION SUMMARY")
+        log(f"{'='*80}")
+        log(f"Successfully traded markets: {len(successfully_traded_markets)}")
         if successfully_traded_markets:
-            print(f"\nMarkets with both orders placed:")
+            log(f"\nMarkets with both orders placed:")
             for market_id in successfully_traded_markets:
-                print(f"  ✓ {market_id}")
+                log(f"  ✓ {market_id}")
         
         if failed_markets:
-            print(f"\nFailed markets: {len(failed_markets)}")
+            log(f"\nFailed markets: {len(failed_markets)}")
             for market_id in failed_markets:
-                print(f"  ✗ {market_id}")
+                log(f"  ✗ {market_id}")
         
-        print(f"\nRemaining bankroll: ${remaining_bankroll/100:.2f}")
-        print(f"Total spent: ${(bankroll - remaining_bankroll)/100:.2f}")
-        print(f"{'='*80}\n")
+        log(f"\nRemaining bankroll: ${remaining_bankroll/100:.2f}")
+        log(f"Total spent: ${(bankroll - remaining_bankroll)/100:.2f}")
+        log(f"{'='*80}\n")
+        flush_report()
+        return remaining_bankroll
             
                 
-    async def run(self):
-        bankroll = self.calculate_remaining_balance() - self.reserve_limit
-        while bankroll > 0:
-            self.identify_market_opportunities()
-            if len(self.market_opportunities) > 0:
-                self.trade(self.market_opportunities, bankroll)
+    def rescore_markets(self, tickers):
+        """
+        Re-check only the given markets (e.g. ones the market book saw change) against the
+        opportunity thresholds, instead of re-scanning every market.
+        
+        Returns:
+            Set of tickers that became opportunities in this call (weren't one before)
+        """
+        opened = set()
+        source = self.market_book.markets if self.market_book is not None else self.market_index
+        market_spreads, market_index, market_prices = self.market_spreads, self.market_index, self.market_prices
+        for ticker in tickers:
+            market = source.get(ticker)
+            if market is None:
+                continue
+            yes_bid, yes_ask, volume = _quote_fields(market)
+            spread = _opportunity_spread(yes_bid, yes_ask) if yes_bid is not None and yes_ask is not None else 0
+            
+            if spread > OPPORTUNITY_MIN_SPREAD and (volume or 0) > OPPORTUNITY_MIN_VOLUME:
+                if ticker not in market_index:
+                    opened.add(ticker)
+                market_spreads[ticker] = spread
+                market_index[ticker] = market
+                market_prices[ticker] = (yes_bid, yes_ask)
             else:
+                market_spreads.pop(ticker, None)
+                market_index.pop(ticker, None)
+                market_prices.pop(ticker, None)
+        
+        # Re-sort the (small) opportunity set by spread, highest first
+        self.market_opportunities = sorted(self.market_index.values(), key=lambda m: market_spreads[m.ticker], reverse=True)
+        return opened
+
+    def current_bankroll(self):
+        """
+        Bankroll available to run_async (balance minus reserve_limit, in cents). Between balance
+        reads it is tracked from what trade() spends; the balance is re-read from the API once
+        BANKROLL_RESYNC_SECONDS have passed, to pick up fills and cancels.
+        """
+        now = time.monotonic()
+        if self._bankroll_cents is None or now >= self._bankroll_stale_after:
+            self._bankroll_cents = self.calculate_remaining_balance() - self.reserve_limit
+            self._bankroll_stale_after = now + BANKROLL_RESYNC_SECONDS
+        return self._bankroll_cents
+
+    async def run_async(self):
+        """
+        Continuous trading loop. With live market data it waits for market book updates (at most
+        1 second), re-scores only the markets that changed and trades just the ones that newly
+        became opportunities; otherwise it re-identifies opportunities over REST each cycle.
+        """
+        bankroll = self.current_bankroll()
+        # trade() puts as many contracts as it can afford into each market in turn, so only the head
+        # of the ranking is ever reached; rank just that many instead of every opportunity
+        top_k = max(ORDER_CONCURRENCY, bankroll // 100)
+        self.identify_market_opportunities(write_csv=False, top_k=top_k)
+        to_trade = self.market_opportunities
+        while bankroll > 0:
+            if len(to_trade) > 0:
+                self._bankroll_cents = self.trade(to_trade, bankroll, prices=self.market_prices)
+            elif len(self.market_opportunities) == 0:
                 print("No trading opportunities available - waiting for next cycle")
-            await asyncio.sleep(1) # runs every second
+            
+            if self.market_book is not None:
+                await asyncio.to_thread(self.market_book.updated.wait, 1.0)
+                opened = self.rescore_markets(self.market_book.take_dirty())
+                # Markets already traded keep their resting orders; only newly opened ones (highest spread first) are traded
+                to_trade = [market for market in self.market_opportunities if market.ticker in opened] if opened else []
+            else:
+                await asyncio.sleep(1)
+                self.identify_market_opportunities(write_csv=False, top_k=top_k)
+                to_trade = self.market_opportunities
+            bankroll = self.current_bankroll()
 
     def run(self, bankroll): # non async version
         if bankroll > 0:
             self.identify_market_opportunities()
             self.market_opportunities = self.filter_market_opportunities()
             if len(self.market_opportunities) > 0:
-                self.trade(self.market_opportunities, bankroll)
+                self.trade(self.market_opportunities, bankroll, prices=self.market_prices)
             else:
                 print("No trading opportunities available - skipping trade execution")
 
@@ -820,7 +1360,7 @@ class BasicMM:
 
 # further filter the market opportunities
     def filter_market_opportunities(self, min_spread=0.03, min_volume=1000, max_spread=0.1, min_price=0.1, 
-                                   min_days_until_resolution=None, max_days_until_resolution=None):
+                                   min_days_until_resolution=None, max_days_until_resolution=None, with_values=False):
         """
         Filter market opportunities by various criteria including resolution date.
         
@@ -831,77 +1371,14 @@ class BasicMM:
             min_price: Minimum bid/ask price
             min_days_until_resolution: Minimum days until market closes/resolves (filters out markets closing too soon)
             max_days_until_resolution: Maximum days until market closes/resolves (filters out markets closing too far away)
+            with_values: If True, return (market, spread, yes_bid, yes_ask, volume) tuples with the values
+                         the filter used, instead of just the markets
         
         Returns:
             Filtered list of market opportunities
         """
-        filtered_opportunities = []
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        
-        for market in self.market_opportunities:
-            # Basic filters
-            # Get spread from market_spreads dict, or calculate it if not available
-            spread = self.get_market_spread(market)
-            volume = getattr(market, 'volume', 0) or 0
-            yes_ask = getattr(market, 'yes_ask', None)
-            yes_bid = getattr(market, 'yes_bid', None)
-            
-            # Skip if missing required data
-            if yes_ask is None or yes_bid is None:
-                continue
-            
-            # If spread not in dictionary, calculate it from bid/ask
-            if spread == 0:
-                # Calculate spread from bid/ask prices (convert from cents to probability if needed)
-                # Prices might be in cents (0-100) or probability (0-1)
-                if yes_bid > 1 or yes_ask > 1:
-                    # Prices are in cents, convert to probability
-                    spread = (yes_ask - yes_bid) / 100.0
-                else:
-                    # Prices are already in probability format
-                    spread = yes_ask - yes_bid
-            
-            # Normalize prices for comparison (convert to probability if in cents)
-            yes_bid_prob = yes_bid / 100.0 if (yes_bid > 1) else yes_bid
-            yes_ask_prob = yes_ask / 100.0 if (yes_ask > 1) else yes_ask
-            
-            # Apply basic filters (all comparisons in probability format)
-            if not (spread > min_spread and volume > min_volume and spread < max_spread and 
-                   yes_ask_prob > min_price and yes_bid_prob > min_price):
-                continue
-            
-            # Filter by resolution date if specified
-            if min_days_until_resolution is not None or max_days_until_resolution is not None:
-                close_time = getattr(market, 'close_time', None)
-                if close_time:
-                    # Handle both datetime objects and string formats
-                    if isinstance(close_time, str):
-                        try:
-                            # Try parsing ISO format
-                            if close_time.endswith('Z'):
-                                close_time = datetime.datetime.fromisoformat(close_time.replace('Z', '+00:00'))
-                            else:
-                                close_time = datetime.datetime.fromisoformat(close_time)
-                        except:
-                            continue
-                    
-                    # Calculate days until resolution
-                    if isinstance(close_time, datetime.datetime):
-                        if close_time.tzinfo is None:
-                            # Assume UTC if no timezone info
-                            close_time = close_time.replace(tzinfo=datetime.timezone.utc)
-                        
-                        days_until_resolution = (close_time - current_time).total_seconds() / 86400.0
-                        
-                        # Apply date filters
-                        if min_days_until_resolution is not None and days_until_resolution < min_days_until_resolution:
-                            continue
-                        if max_days_until_resolution is not None and days_until_resolution > max_days_until_resolution:
-                            continue
-            
-            filtered_opportunities.append(market)
-        
-        return filtered_opportunities
+        return self._filter_markets(self.market_opportunities, min_spread, min_volume, max_spread, min_price,
+                                    min_days_until_resolution, max_days_until_resolution, with_values)
 
     def filter_nfl(self, min_spread=0.03, min_volume=0, max_spread=0.1, min_price=0.1, 
                    min_days_until_resolution=None, max_days_until_resolution=None):
@@ -920,85 +1397,116 @@ class BasicMM:
         Returns:
             Filtered list of market opportunities (only NFL markets)
         """
-        filtered_opportunities = []
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        
+        # First check if market has "KXNFL" in its ticker/name
+        nfl_markets = []
         for market in self.market_opportunities:
-            # First check if market has "KXNFL" in its ticker/name
             market_id = getattr(market, 'ticker', None) or getattr(market, 'market_id', None) or str(market)
-            if 'KXNFL' not in str(market_id).upper():
-                continue
-            
-            # Basic filters
-            # Get spread from market_spreads dict, or calculate it if not available
-            spread = self.get_market_spread(market)
-            volume = getattr(market, 'volume', 0) or 0
-            yes_ask = getattr(market, 'yes_ask', None)
-            yes_bid = getattr(market, 'yes_bid', None)
-            
-            # Skip if missing required data
-            if yes_ask is None or yes_bid is None:
-                continue
-            
-            # If spread not in dictionary, calculate it from bid/ask
-            if spread == 0:
-                # Calculate spread from bid/ask prices (convert from cents to probability if needed)
-                # Prices might be in cents (0-100) or probability (0-1)
-                if yes_bid > 1 or yes_ask > 1:
-                    # Prices are in cents, convert to probability
-                    spread = (yes_ask - yes_bid) / 100.0
-                else:
-                    # Prices are already in probability format
-                    spread = yes_ask - yes_bid
-            
-            # Normalize prices for comparison (convert to probability if in cents)
-            yes_bid_prob = yes_bid / 100.0 if (yes_bid > 1) else yes_bid
-            yes_ask_prob = yes_ask / 100.0 if (yes_ask > 1) else yes_ask
+            if 'KXNFL' in str(market_id).upper():
+                nfl_markets.append(market)
+        
+        return self._filter_markets(nfl_markets, min_spread, min_volume, max_spread, min_price,
+                                    min_days_until_resolution, max_days_until_resolution)
+
+    def _filter_markets(self, markets, min_spread, min_volume, max_spread, min_price,
+                        min_days_until_resolution, max_days_until_resolution, with_values=False):
+        """
+        Apply the spread/volume/price/resolution-date filters to markets as NumPy masks.
+        Shared by filter_market_opportunities and filter_nfl; see those for the arguments.
+        """
+        if not markets:
+            return []
+        
+        if self._opportunity_columns is not None and markets is self._opportunity_columns[0]:
+            # The unchanged opportunity list from the last scan: reuse its columns
+            _, yes_bid, yes_ask, volume, spread = self._opportunity_columns
+        else:
+            # One attrgetter call per market (getattr per field only if a market lacks one)
+            try:
+                rows = list(map(_filter_fields, markets))
+            except AttributeError:
+                rows = [(market.ticker, getattr(market, 'yes_bid', None), getattr(market, 'yes_ask', None),
+                         getattr(market, 'volume', 0)) for market in markets]
+            tickers, bids, asks, volumes = zip(*rows)
             
-            # Apply basic filters (all comparisons in probability format)
-            if not (spread > min_spread and volume > min_volume and spread < max_spread and 
-                   yes_ask_prob > min_price and yes_bid_prob > min_price):
-                continue
+            # Get spread from market_spreads dict (0 if not available); missing prices become NaN and fail every filter
+            spread = np.array(list(map(self.market_spreads.get, tickers, repeat(0))), dtype=np.float64)
+            volume = np.nan_to_num(np.array(volumes, dtype=np.float64))
+            yes_bid = np.array(bids, dtype=np.float64)
+            yes_ask = np.array(asks, dtype=np.float64)
+        
+        # If spread not in dictionary, calculate it from bid/ask
+        # Prices might be in cents (0-100) or probability (0-1)
+        computed_spread = yes_ask - yes_bid
+        in_cents = (yes_bid > 1) | (yes_ask > 1)
+        computed_spread[in_cents] /= 100.0
+        spread = np.where(spread == 0, computed_spread, spread)
+        
+        # Normalize prices for comparison (convert to probability if in cents)
+        yes_bid_prob = np.where(yes_bid > 1, yes_bid / 100.0, yes_bid)
+        yes_ask_prob = np.where(yes_ask > 1, yes_ask / 100.0, yes_ask)
+        
+        # Apply basic filters (all comparisons in probability format)
+        mask = ((spread > min_spread) & (volume > min_volume) & (spread < max_spread) &
+                (yes_ask_prob > min_price) & (yes_bid_prob > min_price))
+        
+        # Filter by resolution date if specified (thresholds converted to seconds once per call)
+        if min_days_until_resolution is not None or max_days_until_resolution is not None:
+            close_ts, undated, unparseable = self._close_time_columns(markets)
+            seconds_until_resolution = close_ts - time.time()
             
-            # Filter by resolution date if specified
-            if min_days_until_resolution is not None or max_days_until_resolution is not None:
-                close_time = getattr(market, 'close_time', None)
-                if close_time:
-                    # Handle both datetime objects and string formats
-                    if isinstance(close_time, str):
-                        try:
-                            # Try parsing ISO format
-                            if close_time.endswith('Z'):
-                                close_time = datetime.datetime.fromisoformat(close_time.replace('Z', '+00:00'))
-                            else:
-                                close_time = datetime.datetime.fromisoformat(close_time)
-                        except:
-                            continue
-                    
-                    # Calculate days until resolution
-                    if isinstance(close_time, datetime.datetime):
-                        if close_time.tzinfo is None:
-                            # Assume UTC if no timezone info
-                            close_time = close_time.replace(tzinfo=datetime.timezone.utc)
-                        
-                        days_until_resolution = (close_time - current_time).total_seconds() / 86400.0
-                        
-                        # Apply date filters
-                        if min_days_until_resolution is not None and days_until_resolution < min_days_until_resolution:
-                            continue
-                        if max_days_until_resolution is not None and days_until_resolution > max_days_until_resolution:
-                            continue
+            date_ok = np.ones(len(markets), dtype=bool)
+            if min_days_until_resolution is not None:
+                date_ok &= ~(seconds_until_resolution < min_days_until_resolution * 86400.0)
+            if max_days_until_resolution is not None:
+                date_ok &= ~(seconds_until_resolution > max_days_until_resolution * 86400.0)
             
-            filtered_opportunities.append(market)
+            # Markets without a close_time are kept; close_time strings that can't be parsed are dropped
+            mask &= (date_ok | undated) & ~unparseable
         
-        return filtered_opportunities
+        kept = np.flatnonzero(mask)
+        if with_values:
+            return list(zip([markets[i] for i in kept.tolist()], spread[kept].tolist(), yes_bid[kept].tolist(),
+                            yes_ask[kept].tolist(), volume[kept].astype(np.int64).tolist()))
+        return [markets[i] for i in kept.tolist()]
+
+    def _close_time_columns(self, markets):
+        """
+        Return (close_ts, undated, unparseable) arrays for markets: close time as unix seconds,
+        no close_time at all, and a close_time string that could not be parsed. close_time is
+        parsed once per market (MarketState.close_ts, else here) and the arrays are kept for
+        the most recent list, so repeated date filters over the same opportunities reuse them.
+        """
+        if self._close_columns is not None and self._close_columns[0] is markets and len(self._close_columns[1]) == len(markets):
+            return self._close_columns[1:]
+        close_times = [getattr(market, 'close_time', None) for market in markets]
+        close_ts = np.array([
+            getattr(market, 'close_ts', None) if hasattr(market, 'close_ts') else close_time_to_epoch(close_time)
+            for market, close_time in zip(markets, close_times)
+        ], dtype=np.float64)
+        undated = np.array([not close_time for close_time in close_times], dtype=bool)
+        unparseable = np.array([isinstance(close_time, str) for close_time in close_times], dtype=bool) & np.isnan(close_ts)
+        self._close_columns = (markets, close_ts, undated, unparseable)
+        return close_ts, undated, unparseable
 
 # execute a single market making trade for the market in market_id_list.  Contracts is the number of contracts to trade
-    def trade_single(self, market_id, contracts):
+    def trade_single(self, market_id, contracts, yes_bid=None, yes_ask=None):
+        """
+        Args:
+            market_id: Market ticker to trade
+            contracts: Number of contracts per order
+            yes_bid: Optional current yes bid already known by the caller (e.g. from the market book)
+            yes_ask: Optional current yes ask already known by the caller
+        """
         print("--- WARNING: trading with actual money ---")
         
-        # Get buy and sell prices using the shared function (pass market_id, not yes_bid/yes_ask)
-        buy_price_cents, sell_price_cents = self.get_price(market_id)
+        # Price straight from the caller's (or the last scan's) bid/ask when known; otherwise
+        # get_price looks the market up (and fetches it if it isn't cached)
+        if (yes_bid is None or yes_ask is None) and market_id in self.market_prices:
+            yes_bid, yes_ask = self.market_prices[market_id]
+        if yes_bid is not None and yes_ask is not None:
+            buy_price_cents, sell_price_cents = self.quote_prices(market_id, yes_bid, yes_ask)
+        else:
+            buy_price_cents, sell_price_cents = self.get_price(market_id)
         
         # Check if get_price returned None values (error case)
         if buy_price_cents is None or sell_price_cents is None:
@@ -1017,8 +1525,9 @@ class BasicMM:
             yes_price=buy_price_cents  # API expects cents (1-99), not probability
         )
         print(f"Buy order placed: {contracts} contracts @ {buy_price_cents}¢")
-        if buy_order and hasattr(buy_order, 'order_id'):
-            print(f"  Order ID: {buy_order.order_id}")
+        buy_order_id = _order_id(buy_order)
+        if buy_order_id:
+            print(f"  Order ID: {buy_order_id}")
                         
         sell_order = self.client.create_order(
             ticker=market_id,
@@ -1029,8 +1538,9 @@ class BasicMM:
             yes_price=sell_price_cents  # API expects cents (1-99), not probability
         )
         print(f"Sell order placed: {contracts} contracts @ {sell_price_cents}¢")
-        if sell_order and hasattr(sell_order, 'order_id'):
-            print(f"  Order ID: {sell_order.order_id}")
+        sell_order_id = _order_id(sell_order)
+        if sell_order_id:
+            print(f"  Order ID: {sell_order_id}")
 
 if __name__ == "__main__":
     mm = BasicMM(reserve_limit=10)
@@ -1045,11 +1555,14 @@ if __name__ == "__main__":
         
     # Filter for markets with good volume and spread of at least 3 cents (0.03)
     print("\nFiltering for markets with good volume and spread >= 3 cents...")
+    # Each market comes back with the spread/bid/ask/volume the filter computed, so the
+    # report below doesn't read or normalize them again
     filtered = mm.filter_market_opportunities(
         min_spread=0.03,  # 3 cents spread minimum
         min_volume=1000,  # Good volume threshold
         max_spread=0.1,   # Maximum spread
-        min_price=0.1     # Minimum price
+        min_price=0.1,    # Minimum price
+        with_values=True
     )
     
     print(f"\n{'='*100}")
@@ -1062,29 +1575,11 @@ if __name__ == "__main__":
         print(f"{'Market ID':<50} {'Title':<40} {'Spread':<10} {'Volume':<12} {'Yes Bid':<10} {'Yes Ask':<10}")
         print("-" * 100)
         
-        # Sort by spread (highest first) for better visibility
-        sorted_opportunities = sorted(filtered, key=lambda m: mm.get_market_spread(m) or 0, reverse=True)
-        
-        for market in sorted_opportunities:
+        # Sort by spread (highest first, stable) for better visibility
+        for market, spread, yes_bid, yes_ask, volume in sorted(filtered, key=itemgetter(1), reverse=True):
             market_id = getattr(market, 'ticker', None) or getattr(market, 'market_id', 'N/A')
             title = getattr(market, 'title', None) or getattr(market, 'question', 'N/A')
             
-            # Get spread
-            spread = mm.get_market_spread(market)
-            if spread == 0:
-                # Calculate from bid/ask
-                yes_bid = getattr(market, 'yes_bid', None)
-                yes_ask = getattr(market, 'yes_ask', None)
-                if yes_bid is not None and yes_ask is not None:
-                    if yes_bid > 1 or yes_ask > 1:
-                        spread = (yes_ask - yes_bid) / 100.0
-                    else:
-                        spread = yes_ask - yes_bid
-            
-            volume = getattr(market, 'volume', 0) or 0
-            yes_bid = getattr(market, 'yes_bid', None)
-            yes_ask = getattr(market, 'yes_ask', None)
-            
             # Format prices
             yes_bid_str = f"{yes_bid:.2f}¢" if yes_bid and yes_bid > 1 else f"{yes_bid*100:.2f}¢" if yes_bid else "N/A"
             yes_ask_str = f"{yes_ask:.2f}¢" if yes_ask and yes_ask > 1 else f"{yes_ask*100:.2f}¢" if yes_ask else "N/A"
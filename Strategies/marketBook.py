@@ -0,0 +1,263 @@
+import sys
+import os
+import json
+import asyncio
+import threading
+import datetime
+from operator import attrgetter
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from Setup.apiSetup import KalshiAPI
+try:
+    import websockets
+except ImportError:
+    websockets = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+''' This file:
+market state
+market book (live market data over websocket, REST reconcile)
+'''
+
+# Market attributes copied from the REST snapshot (the ticker channel only updates prices/volume)
+MARKET_STATE_FIELDS = (
+    "ticker", "title", "status", "close_time", "event_ticker", "yes_bid", "yes_ask",
+    "no_bid", "no_ask", "volume", "volume_24h", "last_price"
+)
+_state_fields = attrgetter(*MARKET_STATE_FIELDS)
+
+def _read_state_fields(market):
+    """Read MARKET_STATE_FIELDS from a market in one attrgetter call (getattr per field if one is missing)."""
+    try:
+        return _state_fields(market)
+    except AttributeError:
+        return tuple(getattr(market, name, None) for name in MARKET_STATE_FIELDS)
+
+def close_time_to_epoch(close_time):
+    """Convert a market close_time (datetime or ISO string) to unix seconds, NaN if unknown."""
+    if isinstance(close_time, str):
+        try:
+            close_time = datetime.datetime.fromisoformat(close_time.replace('Z', '+00:00'))
+        except ValueError:
+            return float('nan')
+    if isinstance(close_time, datetime.datetime):
+        if close_time.tzinfo is None:
+            # Assume UTC if no timezone info
+            close_time = close_time.replace(tzinfo=datetime.timezone.utc)
+        return close_time.timestamp()
+    return float('nan')
+
+class MarketState:
+    """
+    Latest known state of one market. Exposes the same attributes as the SDK market objects,
+    stored in slots, plus close_ts (close_time as unix seconds, parsed once).
+    """
+    __slots__ = MARKET_STATE_FIELDS + ("close_ts",)
+
+    def __init__(self, **fields):
+        for name in MARKET_STATE_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.close_ts = close_time_to_epoch(self.close_time)
+
+    @classmethod
+    def from_market(cls, market):
+        state = cls.__new__(cls)
+        state.update_from_market(market)
+        return state
+
+    def update_from_market(self, market):
+        for name, value in zip(MARKET_STATE_FIELDS, _read_state_fields(market)):
+            setattr(self, name, value)
+        self.close_ts = close_time_to_epoch(self.close_time)
+
+    def copy(self):
+        """Return a new MarketState with the same field values."""
+        state = MarketState.__new__(MarketState)
+        for name in self.__slots__:
+            setattr(state, name, getattr(self, name))
+        return state
+
+class MarketBook:
+    """
+    In-memory market data kept current by one WebSocket ticker subscription.
+
+    A REST snapshot seeds the book and is repeated every reconcile_seconds to pick up
+    new markets and fill any gaps; in between, ticker messages update bid/ask/volume.
+    States are copy-on-write: an update swaps a new MarketState into the book and never
+    changes one already handed out, so readers always see one tick's bid and ask together.
+    The book runs its own asyncio loop on a background thread so synchronous callers
+    (BasicMM.run, identify_market_opportunities) can read it at any time.
+    """
+    PROD_WS_URL = "wss://api.elections.kalshi.com/trade-api/ws/v2"
+    DEMO_WS_URL = "wss://demo-api.kalshi.co/trade-api/ws/v2"
+    WS_PATH = "/trade-api/ws/v2"
+
+    def __init__(self, fetch_snapshot, demo=False, reconcile_seconds=30):
+        """
+        Args:
+            fetch_snapshot: Callable returning a list of market objects over REST (cold start / reconcile)
+            demo: Whether to use demo environment
+            reconcile_seconds: Seconds between REST reconciles
+        """
+        self.fetch_snapshot = fetch_snapshot
+        self.demo = demo
+        self.ws_url = self.DEMO_WS_URL if demo else self.PROD_WS_URL
+        self.reconcile_seconds = reconcile_seconds
+        self.markets = {}  # ticker -> MarketState
+        self.running = False
+        self.reconnect_delay = 5  # seconds
+        self.max_reconnect_delay = 60  # seconds
+        self._lock = threading.Lock()
+        self._ready = threading.Event()  # Set once the first REST snapshot is loaded
+        self.updated = threading.Event()  # Set when a ticker message changes a market's bid/ask/volume
+        self._dirty = set()  # Tickers whose bid/ask/volume changed since the last take_dirty()
+        self._thread = None
+        self._loop = None  # The background thread's event loop (set while it runs)
+        self._stopping = None  # asyncio.Event on that loop, set by stop() to cut waits short
+        self._ws = None  # Open WebSocket connection, closed by stop()
+
+    def start(self):
+        """Start the background thread (REST seed, then WebSocket updates)."""
+        if self._thread is not None:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Close the WebSocket, end the background loops and wait (up to timeout seconds) for the thread."""
+        self.running = False
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._stopping.set)
+                if self._ws is not None:
+                    asyncio.run_coroutine_threadsafe(self._ws.close(), loop)
+            except RuntimeError:
+                pass  # The loop has already finished
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wait_ready(self, timeout=None):
+        """Block until the first REST snapshot is loaded. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def snapshot(self):
+        """Return the current market states as a list."""
+        with self._lock:
+            return list(self.markets.values())
+
+    def take_dirty(self):
+        """Return the tickers whose bid/ask/volume changed since the last call, and reset the updated flag."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self.updated.clear()
+        return dirty
+
+    def reconcile(self):
+        """Refresh every market from a REST snapshot, dropping markets it no longer lists (closed or settled)."""
+        markets = self.fetch_snapshot()
+        with self._lock:
+            current = {}
+            for market in markets:
+                current[market.ticker] = MarketState.from_market(market)
+            self.markets = current
+            self._dirty.intersection_update(current)
+        self._ready.set()
+
+    def apply_ticker(self, msg):
+        """Apply one ticker channel message to the book."""
+        yes_bid = msg.get("yes_bid")
+        yes_ask = msg.get("yes_ask")
+        volume = msg.get("volume")
+        price = msg.get("price")
+        with self._lock:
+            current = self.markets.get(msg.get("market_ticker"))
+            if current is None:
+                return  # Not in the snapshot yet, picked up by the next reconcile
+            changed = ((yes_bid is not None and yes_bid != current.yes_bid) or
+                       (yes_ask is not None and yes_ask != current.yes_ask) or
+                       (volume is not None and volume != current.volume))
+            state = current.copy()
+            if yes_bid is not None:
+                state.yes_bid = yes_bid
+                state.no_ask = 100 - yes_bid
+            if yes_ask is not None:
+                state.yes_ask = yes_ask
+                state.no_bid = 100 - yes_ask
+            if volume is not None:
+                state.volume = volume
+            if price is not None:
+                state.last_price = price
+            self.markets[state.ticker] = state
+            if changed:
+                self._dirty.add(state.ticker)
+        if changed:
+            self.updated.set()
+
+    async def _wait(self, seconds):
+        """Sleep for seconds, returning early once stop() is called."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _reconcile_loop(self):
+        while self.running:
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                print(f"[{datetime.datetime.now().isoformat()}] ⚠ Market book REST reconcile failed: {e}")
+            await self._wait(self.reconcile_seconds)
+
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while self.running:
+            try:
+                try:
+                    additional_headers = list(KalshiAPI().auth_headers("GET", self.WS_PATH, demo=self.demo).items())
+                except Exception as e:
+                    print(f"[{datetime.datetime.now().isoformat()}] ⚠ Could not sign WebSocket handshake: {e}")
+                    additional_headers = None
+
+                async with websockets.connect(self.ws_url, additional_headers=additional_headers,
+                                              ping_interval=20, ping_timeout=10, close_timeout=10) as ws:
+                    self._ws = ws
+                    # No market_ticker: the ticker channel then covers every market
+                    await ws.send(json.dumps({"id": 1, "cmd": "subscribe", "params": {"channels": ["ticker"]}}))
+                    print(f"[{datetime.datetime.now().isoformat()}] ✓ Market book subscribed to ticker updates")
+                    delay = self.reconnect_delay
+                    async for message in ws:
+                        if not self.running:
+                            break
+                        data = _json_loads(message)
+                        if data.get("type") == "ticker":
+                            self.apply_ticker(data.get("msg", {}))
+            except Exception as e:
+                if not self.running:
+                    break
+                print(f"[{datetime.datetime.now().isoformat()}] ⚠ Market book WebSocket error: {e}. Reconnecting in {delay}s (REST reconcile continues)")
+                await self._wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self._ws = None
+
+    async def _run(self):
+        self._stopping = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        tasks = [self._reconcile_loop()]
+        if websockets is not None:
+            tasks.append(self._listen())
+        else:
+            print("websockets not installed, market book will only refresh via REST reconcile")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self._loop = None
@@ -0,0 +1,35 @@
+"""Stoploss/<market_id>.json files, shared by the market maker (writer) and the websocket handler (reader/updater)."""
+
+import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def read_stoploss(path):
+    """Load a Stoploss/<market_id>.json file (orjson when installed)."""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+
+def dump_stoploss(data):
+    """
+    Encode stop loss data as indented JSON in one call, producing the same bytes with or without orjson.
+
+    Args:
+        data: Stop loss dict for one market
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def write_stoploss(path, data):
+    """Rewrite a Stoploss/<market_id>.json file in the shared format."""
+    payload = dump_stoploss(data)
+    with open(path, 'wb') as f:
+        f.write(payload)
@@ -11,37 +11,55 @@ import signal
 import time
 import hashlib
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Callable, Awaitable
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 
-# Add project root to path for imports
-sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# Add project root to path for imports (once; the interactive CLI and web app have usually added it already)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
 
 from Setup.apiSetup import KalshiAPI
 import websockets
 from websockets.exceptions import ConnectionClosed, WebSocketException
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from cryptography.hazmat.backends import default_backend
 
 
+CANCEL_CONCURRENCY = 16  # Max cancel_order requests in flight at once in cancel_all_orders
+
+
 class KalshiMarketStreamer:
     """WebSocket client for streaming Kalshi market data."""
     
     # WebSocket endpoints (based on Kalshi docs: https://docs.kalshi.com/websockets/)
     PROD_WS_URL = "wss://api.elections.kalshi.com/trade-api/ws/v2"
     DEMO_WS_URL = "wss://demo-api.kalshi.co/trade-api/ws/v2"
+    # Decoder for incoming frames (orjson when installed); override to plug in another parser
+    json_loads = staticmethod(orjson.loads if orjson is not None else json.loads)
     
-    def __init__(self, market_ids: Optional[List[str]] = None, market_id: Optional[str] = None, demo: bool = False, channels: Optional[List[str]] = None):
+    def __init__(self, market_ids: Optional[List[str]] = None, market_id: Optional[str] = None, demo: bool = False, channels: Optional[List[str]] = None, verbose: bool = True):
         """
         Initialize the market streamer.
         
         Args:
-            market_ids: List of market ticker IDs to subscribe to (e.g., ['MARKET1', 'MARKET2'])
+            market_ids: List (or tuple) of market ticker IDs to subscribe to (e.g., ['MARKET1', 'MARKET2'])
             market_id: Single market ticker ID (for backward compatibility)
             demo: Whether to use demo environment (default: False for production)
             channels: List of channels to subscribe to (default: ["ticker", "orderbook_delta", "trade"])
+            verbose: Print every received message and per-update notices (default: True).
+                Turn off when a callback consumes the feed, so the receive loop isn't blocked on stdout.
         """
         # Handle both single market_id (backward compat) and list of market_ids
         if market_ids is None:
@@ -49,7 +67,8 @@ class KalshiMarketStreamer:
                 raise ValueError("Either market_ids or market_id must be provided")
             self.market_ids = [market_id]
         else:
-            self.market_ids = market_ids if isinstance(market_ids, list) else [market_ids]
+            # Any sequence of tickers works (e.g. a module-level tuple); a bare string is one market
+            self.market_ids = [market_ids] if isinstance(market_ids, str) else list(market_ids)
         
         # Keep backward compatibility
         self.market_id = self.market_ids[0] if self.market_ids else None
@@ -57,8 +76,11 @@ class KalshiMarketStreamer:
         self.demo = demo
         self.ws_url = self.DEMO_WS_URL if demo else self.PROD_WS_URL
         self.default_channels = channels if channels else ["ticker", "orderbook_delta", "trade"]
+        self.verbose = verbose
         self.ws: Optional[Any] = None  # websockets.WebSocketClientProtocol
         self.running = False
+        self.stopping = asyncio.Event()  # Set by shutdown(), wakes a reconnect backoff early
+        self.ready = asyncio.Event()  # Set once a connect() attempt finishes (handshake done and subscriptions sent, or failed)
         self.reconnect_delay = 5  # seconds
         self.max_reconnect_delay = 60  # seconds
         
@@ -88,6 +110,8 @@ class KalshiMarketStreamer:
         self.on_trade_update: Optional[Callable[[Dict[str, Any], Optional[str]], Awaitable[None]]] = None
         self.on_fill_update: Optional[Callable[[Dict[str, Any], Optional[str]], Awaitable[None]]] = None
         self.on_position_update: Optional[Callable[[Dict[str, Any], Optional[str]], Awaitable[None]]] = None
+        # Called (synchronously) with every raw frame before it is decoded
+        self.on_raw_message: Optional[Callable[[str], None]] = None
     
     def _is_connected(self) -> bool:
         """
@@ -153,6 +177,7 @@ class KalshiMarketStreamer:
         Connect to the WebSocket server with authentication headers.
         Based on Kalshi documentation: https://docs.kalshi.com/websockets/
         """
+        self.ready.clear()
         try:
             print(f"[{datetime.now().isoformat()}] Connecting to {self.ws_url}...")
             
@@ -196,18 +221,38 @@ class KalshiMarketStreamer:
                 # Initial connection - subscribe to default channels
                 markets_to_resubscribe = {market_id: self.default_channels for market_id in self.market_ids}
             
-            # Subscribe to all markets
+            # Subscribe to all markets: one subscribe command per distinct channel list
             print(f"[{datetime.now().isoformat()}] Re-subscribing to {len(markets_to_resubscribe)} markets...")
+            markets_by_channels = {}
             for market_id, channels in markets_to_resubscribe.items():
-                await self.subscribe_to_market(market_id, channels)
-                await asyncio.sleep(0.1)  # Small delay between subscriptions
+                # (markets whose channels were never confirmed fall back to the default channels)
+                markets_by_channels.setdefault(tuple(channels or self.default_channels), []).append(market_id)
+            for channels, market_ids in markets_by_channels.items():
+                await self.subscribe_to_multiple_markets(market_ids, list(channels))
             
+            self.ready.set()
             return True
             
         except Exception as e:
             print(f"[{datetime.now().isoformat()}] ✗ Connection failed: {e}")
+            self.ready.set()  # Wake wait_ready() callers; they see the connection isn't open
             return False
     
+    async def wait_ready(self, timeout: Optional[float] = 10) -> bool:
+        """
+        Wait for an in-flight connect() attempt to finish, instead of sleeping a fixed time.
+        
+        Args:
+            timeout: Seconds to wait at most (None waits indefinitely)
+        Returns:
+            True if connected, False on timeout
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self._is_connected()
+    
     async def authenticate(self):
         """
         Authenticate with the WebSocket server (if needed).
@@ -380,30 +425,77 @@ class KalshiMarketStreamer:
     
     async def subscribe_to_multiple_markets(self, market_ids: List[str], channels: Optional[List[str]] = None):
         """
-        Subscribe to multiple markets at once.
+        Subscribe to multiple markets at once, with a single subscribe command
+        (params.market_tickers) instead of one command per market.
         
         Args:
             market_ids: List of market ticker IDs
             channels: List of channels to subscribe to (default: ["ticker", "orderbook_delta", "trade"])
+        Returns:
+            Subscription ID (command ID), or None if failed or nothing needed subscribing
         """
-        for market_id in market_ids:
-            await self.subscribe_to_market(market_id, channels)
-            # Small delay between subscriptions to avoid rate limiting
-            await asyncio.sleep(0.1)
+        if channels is None:
+            channels = ["ticker", "orderbook_delta", "trade"]
+        
+        if not self._is_connected():
+            print(f"[{datetime.now().isoformat()}] ⚠ Cannot subscribe: WebSocket not connected")
+            return None
+        
+        # Skip markets already subscribed to all requested channels
+        requested_channels = set(channels)
+        new_market_ids = [market_id for market_id in dict.fromkeys(market_ids)
+                          if not requested_channels.issubset(self.subscribed_markets.get(market_id, {}).keys())]
+        if not new_market_ids:
+            return None
+        if len(new_market_ids) == 1:
+            return await self.subscribe_to_market(new_market_ids[0], channels)
+        
+        try:
+            subscription_id = self.subscription_id_counter
+            self.subscription_id_counter += 1
+            
+            subscription_message = {
+                "id": subscription_id,
+                "cmd": "subscribe",
+                "params": {
+                    "channels": channels,
+                    "market_tickers": new_market_ids
+                }
+            }
+            
+            await self.ws.send(json.dumps(subscription_message))
+            print(f"[{datetime.now().isoformat()}] ✓ Sent subscribe command (id={subscription_id}) for {len(new_market_ids)} markets, channels: {channels}")
+            
+            # Initialize market tracking (SID will be set when we get "subscribed" response)
+            for market_id in new_market_ids:
+                self.subscribed_markets.setdefault(market_id, {})
+            
+            return subscription_id
+            
+        except Exception as e:
+            print(f"[{datetime.now().isoformat()}] ✗ Subscription error for {len(new_market_ids)} markets: {e}")
+            return None
     
     async def handle_message(self, message: str):
         """
         Handle incoming WebSocket messages.
         Based on Kalshi docs: https://docs.kalshi.com/websockets/
         """
+        if self.on_raw_message:
+            try:
+                self.on_raw_message(message)
+            except Exception as e:
+                print(f"[{datetime.now().isoformat()}] ⚠ Error in raw message callback: {e}")
+        
         try:
-            data = json.loads(message)
+            data = self.json_loads(message)
             timestamp = datetime.now().isoformat()
             
             # Print formatted message
-            print(f"\n[{timestamp}] === Received Message ===")
-            print(json.dumps(data, indent=2))
-            print(f"[{timestamp}] === End Message ===\n")
+            if self.verbose:
+                print(f"\n[{timestamp}] === Received Message ===\n"
+                      f"{json.dumps(data, indent=2)}\n"
+                      f"[{timestamp}] === End Message ===\n")
             
             # Handle different message types per Kalshi docs
             msg_type = data.get("type", "unknown")
@@ -533,7 +625,8 @@ class KalshiMarketStreamer:
                 print(f"[{datetime.now().isoformat()}] ⚠ Orderbook update received but no market_id found. Data: {json.dumps(data, indent=2)}")
                 return
             
-            print(f"[{datetime.now().isoformat()}] 📊 Orderbook update received for {market_id}")
+            if self.verbose:
+                print(f"[{datetime.now().isoformat()}] 📊 Orderbook update received for {market_id}")
             
             # Pass the msg data (or full data if no msg) to the callback
             # The callback expects the orderbook data, not the wrapper
@@ -559,7 +652,8 @@ class KalshiMarketStreamer:
         """
         try:
             market_id = data.get("market_ticker") or data.get("market_id")
-            print(f"[{datetime.now().isoformat()}] 📈 Ticker update received for {market_id}")
+            if self.verbose:
+                print(f"[{datetime.now().isoformat()}] 📈 Ticker update received for {market_id}")
             
             # Call callback if set (for trading integration)
             if self.on_ticker_update:
@@ -577,7 +671,8 @@ class KalshiMarketStreamer:
         """
         try:
             market_id = data.get("market_ticker") or data.get("market_id")
-            print(f"[{datetime.now().isoformat()}] 💰 Trade update received for {market_id}")
+            if self.verbose:
+                print(f"[{datetime.now().isoformat()}] 💰 Trade update received for {market_id}")
             
             # Note: This is for public trades, not user fills
             # User fills come through "fill" channel
@@ -664,6 +759,24 @@ class KalshiMarketStreamer:
             print(f"[{datetime.now().isoformat()}] ⚠ Error getting best ask for {market_id}: {e}")
             return None
     
+    def get_best_bid_ask(self, market_id: str) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Get the best bid and ask for a market from a single market request
+        (get_best_bid and get_best_ask each fetch the market separately).
+        
+        Args:
+            market_id: Market ticker ID
+            
+        Returns:
+            Tuple of (best bid, best ask), or (None, None) if error
+        """
+        try:
+            market = self.api_client.getMarket(market_id)
+            return market.yes_bid, market.yes_ask
+        except Exception as e:
+            print(f"[{datetime.now().isoformat()}] ⚠ Error getting bid/ask for {market_id}: {e}")
+            return None, None
+    
     def get_market_spread(self, market_id: str) -> Optional[float]:
         """
         Calculate the spread (ask - bid) for a market.
@@ -675,8 +788,7 @@ class KalshiMarketStreamer:
             Spread as float, or None if unable to calculate
         """
         try:
-            bid = self.get_best_bid(market_id)
-            ask = self.get_best_ask(market_id)
+            bid, ask = self.get_best_bid_ask(market_id)
             if bid is not None and ask is not None:
                 return ask - bid
             return None
@@ -765,17 +877,14 @@ class KalshiMarketStreamer:
         Returns:
             Number of orders cancelled
         """
-        cancelled_count = 0
-        orders_to_cancel = list(self.active_orders.keys())
+        orders_to_cancel = [order_id for order_id, order_info in list(self.active_orders.items())
+                            if market_id is None or order_info['market_id'] == market_id]
+        if not orders_to_cancel:
+            return 0
         
-        for order_id in orders_to_cancel:
-            order_info = self.active_orders.get(order_id)
-            if order_info:
-                if market_id is None or order_info['market_id'] == market_id:
-                    if self.cancel_order(order_id):
-                        cancelled_count += 1
-        
-        return cancelled_count
+        # Send the cancels concurrently, so cancelling N orders takes about one round trip instead of N
+        with ThreadPoolExecutor(max_workers=min(CANCEL_CONCURRENCY, len(orders_to_cancel))) as executor:
+            return sum(executor.map(self.cancel_order, orders_to_cancel))
     
     def get_balance(self) -> Optional[float]:
         """
@@ -864,8 +973,7 @@ class KalshiMarketStreamer:
             Dictionary with 'buy_order' and 'sell_order' keys, or None values if failed
         """
         try:
-            best_bid = self.get_best_bid(market_id)
-            best_ask = self.get_best_ask(market_id)
+            best_bid, best_ask = self.get_best_bid_ask(market_id)
             
             if best_bid is None or best_ask is None:
                 print(f"[{datetime.now().isoformat()}] ⚠ Cannot get bid/ask prices for {market_id}")
@@ -964,7 +1072,11 @@ class KalshiMarketStreamer:
         delay = self.reconnect_delay
         while self.running:
             print(f"[{datetime.now().isoformat()}] Attempting to reconnect in {delay} seconds...")
-            await asyncio.sleep(delay)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+                break  # shutdown() was called during the backoff
+            except asyncio.TimeoutError:
+                pass
             
             try:
                 # Close existing connection if it exists
@@ -987,6 +1099,7 @@ class KalshiMarketStreamer:
     async def run(self):
         """Main run loop with reconnection logic."""
         self.running = True
+        self.stopping.clear()
         
         # Setup signal handlers for graceful shutdown
         # Note: add_signal_handler may not work on all platforms, so we also handle KeyboardInterrupt
@@ -996,6 +1109,9 @@ class KalshiMarketStreamer:
                 def signal_handler(sig):
                     print(f"\n[{datetime.now().isoformat()}] Received signal {sig}, shutting down...")
                     self.shutdown()
+                    if self.ws is not None:
+                        # Closing the socket ends the pending recv() now, instead of after its timeout
+                        loop.create_task(self.ws.close())
                 for sig in (signal.SIGTERM, signal.SIGINT):
                     try:
                         loop.add_signal_handler(sig, lambda s=sig: signal_handler(s))
@@ -1026,9 +1142,11 @@ class KalshiMarketStreamer:
     def shutdown(self):
         """Stop the streamer."""
         self.running = False
+        self.stopping.set()
     
     async def close(self):
         """Close the WebSocket connection."""
+        self.ready.clear()
         if self.ws:
             try:
                 await self.ws.close()
@@ -1060,6 +1178,11 @@ async def main():
         action="store_true",
         help="Use demo environment instead of production"
     )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Don't print every received message (subscription, fill and error notices are still shown)"
+    )
     parser.add_argument(
         "--channels",
         type=str,
@@ -1085,7 +1208,8 @@ async def main():
         if invalid_channels:
             parser.error(f"Invalid channels: {invalid_channels}. Valid channels are: {valid_channels}")
     
-    streamer = KalshiMarketStreamer(market_ids=market_ids, demo=args.demo, channels=args.channels)
+    streamer = KalshiMarketStreamer(market_ids=market_ids, demo=args.demo, channels=args.channels,
+                                    verbose=not args.quiet)
     
     try:
         await streamer.run()
@@ -1096,5 +1220,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # uvloop's event loop when installed (faster message handling), asyncio's default otherwise
+    (uvloop.run if uvloop is not None else asyncio.run)(main())
 
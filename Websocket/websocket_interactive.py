@@ -10,6 +10,10 @@ import os
 from datetime import datetime
 from collections import deque
 from typing import Optional, List
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # Add project root to path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -351,7 +355,8 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        # uvloop's event loop when installed (faster message handling), asyncio's default otherwise
+        (uvloop.run if uvloop is not None else asyncio.run)(main())
     except KeyboardInterrupt:
         print("\nExiting...")
 
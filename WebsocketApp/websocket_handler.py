@@ -6,15 +6,20 @@ import time
 import os
 import requests
 from datetime import datetime
-from typing import Dict, Set, List, Optional, Callable, Any
+from typing import Dict, Set, List, Optional, Callable, Any, Tuple
 from collections import deque
 import sys
 import copy
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 project_root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 from Websocket.market_streamer import KalshiMarketStreamer
 from Setup.apiSetup import KalshiAPI
+from Strategies.stoploss import read_stoploss, write_stoploss
 
 
 class MarketData:
@@ -42,6 +47,7 @@ class KalshiWebSocketHandler:
         self.message_callbacks: List[Callable] = []
         self.logs: List[Dict] = []
         self.api_client = KalshiAPI().get_client(demo=demo)
+        self.http_session = requests.Session()  # Keep-alive session, so each subscribe's orderbook fetch skips the TCP/TLS handshake
         
         self.data_dir = os.path.join(os.path.dirname(__file__), 'data')
         os.makedirs(self.data_dir, exist_ok=True)
@@ -50,6 +56,10 @@ class KalshiWebSocketHandler:
         self.price_data: Dict[str, List[Dict]] = {}
         self.price_data_file = os.path.join(self.data_dir, 'price_data.json')
         self.subscriptions_file = os.path.join(self.data_dir, 'subscriptions.json')
+        # Markets with a stop loss check running -> latest (bid, ask) that arrived meanwhile (None if none)
+        self._stop_loss_pending: Dict[str, Optional[Tuple[float, float]]] = {}
+        # Market -> (bid, ask, stop loss file mtime) of its last check that sent no order
+        self._stop_loss_checked: Dict[str, Tuple[float, float, int]] = {}
         
         self._load_price_data()
         self._load_subscriptions()
@@ -76,16 +86,17 @@ class KalshiWebSocketHandler:
         self.add_log('info', f'Connecting to Kalshi WebSocket (demo={self.demo})')
         
         try:
-            self.streamer = KalshiMarketStreamer(market_ids=[], demo=self.demo, channels=["ticker", "orderbook_delta", "trade"])
-            self.streamer.on_orderbook_update = lambda d, m: asyncio.ensure_future(self._handle_orderbook_update(d, m))
-            self.streamer.on_ticker_update = lambda d, m: asyncio.ensure_future(self._handle_ticker_update(d, m))
-            self.streamer.on_trade_update = lambda d, m: asyncio.ensure_future(self._handle_trade_update(d, m))
-            
-            original_handle = self.streamer.handle_message
-            async def wrapped_handle(message: str) -> None:
-                self._emit_raw_message(message)
-                await original_handle(message)
-            self.streamer.handle_message = wrapped_handle
+            self.streamer = KalshiMarketStreamer(market_ids=[], demo=self.demo, channels=["ticker", "orderbook_delta", "trade"],
+                                                 verbose=False)
+            # Bind the handlers once so each per-message callback only touches its own closure
+            ensure_future = asyncio.ensure_future
+            handle_orderbook = self._handle_orderbook_update
+            handle_ticker = self._handle_ticker_update
+            handle_trade = self._handle_trade_update
+            self.streamer.on_orderbook_update = lambda d, m: ensure_future(handle_orderbook(d, m))
+            self.streamer.on_ticker_update = lambda d, m: ensure_future(handle_ticker(d, m))
+            self.streamer.on_trade_update = lambda d, m: ensure_future(handle_trade(d, m))
+            self.streamer.on_raw_message = self._emit_raw_message
             
             if await self.streamer.connect():
                 self.connection_status = 'connected'
@@ -99,8 +110,13 @@ class KalshiWebSocketHandler:
             self.connection_status = 'error'
     
     def _emit_raw_message(self, message: str):
+        if not self.message_callbacks:
+            return
         try:
-            formatted = json.dumps(json.loads(message), indent=2)
+            if orjson is not None:
+                formatted = orjson.dumps(orjson.loads(message), option=orjson.OPT_INDENT_2).decode()
+            else:
+                formatted = json.dumps(json.loads(message), indent=2)
         except:
             formatted = message
         for cb in self.message_callbacks:
@@ -115,10 +131,9 @@ class KalshiWebSocketHandler:
                 self.add_log('warning', f'Orderbook update for unsubscribed market: {market_id}')
                 return
             
-            if market_id not in self.market_data:
-                self.market_data[market_id] = MarketData(market_id)
-            
-            market = self.market_data[market_id]
+            market = self.market_data.get(market_id)
+            if market is None:
+                market = self.market_data[market_id] = MarketData(market_id)
             
             # Extract orderbook_data from nested msg field if present
             orderbook_data = data.get('msg', data)
@@ -290,18 +305,20 @@ class KalshiWebSocketHandler:
     async def _handle_ticker_update(self, data: Dict, market_id: Optional[str]):
         if market_id is None or market_id not in self.subscribed_markets:
             return
-        if market_id not in self.market_data:
-            self.market_data[market_id] = MarketData(market_id)
+        market = self.market_data.get(market_id)
+        if market is None:
+            market = self.market_data[market_id] = MarketData(market_id)
         
-        market = self.market_data[market_id]
         market.ticker = data
         market.last_update = int(time.time() * 1000)
         
-        bid = None
-        ask = None
-        if 'yes_bid' in data and 'yes_ask' in data:
+        bid = data.get('yes_bid')
+        ask = data.get('yes_ask')
+        if bid is not None and ask is not None:
             try:
-                bid, ask = float(data['yes_bid']), float(data['yes_ask'])
+                # Kalshi sends integer cents; keep them as ints (exact stop loss comparisons), converting only other types
+                if type(bid) is not int or type(ask) is not int:
+                    bid, ask = float(bid), float(ask)
                 if bid > 0 and ask > 0:
                     market.yes_price = (bid + ask) / 2
                     market.no_price = 100 - market.yes_price
@@ -310,9 +327,9 @@ class KalshiWebSocketHandler:
         
         self._store_price_data(market_id, market.yes_price, market.no_price)
         
-        # Check stop loss if we have bid/ask prices
+        # Check stop loss if we have bid/ask prices (as its own task, so the updates below aren't held up by an order)
         if bid is not None and ask is not None:
-            await self._check_stop_loss(market_id, bid, ask)
+            asyncio.ensure_future(self._check_stop_loss(market_id, bid, ask))
         
         if market.yes_price is not None:
             for cb in self.message_callbacks:
@@ -324,10 +341,10 @@ class KalshiWebSocketHandler:
     async def _handle_trade_update(self, data: Dict, market_id: Optional[str]):
         if market_id is None or market_id not in self.subscribed_markets:
             return
-        if market_id not in self.market_data:
-            self.market_data[market_id] = MarketData(market_id)
+        market = self.market_data.get(market_id)
+        if market is None:
+            market = self.market_data[market_id] = MarketData(market_id)
         
-        market = self.market_data[market_id]
         market.recent_trades.append(data)
         market.last_update = int(time.time() * 1000)
         
@@ -395,7 +412,7 @@ class KalshiWebSocketHandler:
         try:
             url = f"{self.api_client.api_client.configuration.host}/markets/{market_id}/orderbook"
             self.add_log('info', f'Fetching orderbook from {url}')
-            resp = requests.get(url, timeout=10)
+            resp = await asyncio.to_thread(self.http_session.get, url, timeout=10)  # Off the event loop, so updates keep flowing
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
@@ -452,7 +469,11 @@ class KalshiWebSocketHandler:
         self.add_log('info', f'Subscribing to {market_id}')
         
         if not self.streamer or not self.streamer._is_connected():
-            await self.connect()
+            if self.streamer and self.connection_status == 'connecting':
+                # A connect is already in flight: wait for its handshake instead of opening a second socket
+                await self.streamer.wait_ready(timeout=10)
+            else:
+                await self.connect()
             if not self.streamer or not self.streamer._is_connected():
                 return False
         
@@ -497,6 +518,7 @@ class KalshiWebSocketHandler:
     async def disconnect(self):
         if self.streamer:
             self.streamer.shutdown()
+            await self.streamer.close()  # Ends the old listen() now, so a reconnect needn't wait it out
             self.streamer = None
         self.connection_status = 'disconnected'
         self.subscribed_markets.clear()
@@ -504,26 +526,51 @@ class KalshiWebSocketHandler:
     
     async def force_reconnect(self):
         await self.disconnect()
-        await asyncio.sleep(1)
         await self.connect()
     
     async def _check_stop_loss(self, market_id: str, current_bid: float, current_ask: float):
-        """Check if stop loss conditions are met and execute stop loss orders"""
+        """
+        Check if stop loss conditions are met and execute stop loss orders.
+        Orders are sent from a worker thread so the event loop keeps processing
+        market updates. Quotes arriving while a check runs are conflated: only the
+        latest one is kept, and it is checked once the running check finishes.
+        """
+        if market_id in self._stop_loss_pending:
+            self._stop_loss_pending[market_id] = (current_bid, current_ask)
+            return
+        quote = (current_bid, current_ask)
+        try:
+            while quote is not None:
+                self._stop_loss_pending[market_id] = None
+                await self._run_stop_loss(market_id, *quote)
+                quote = self._stop_loss_pending[market_id]
+        finally:
+            del self._stop_loss_pending[market_id]
+    
+    async def _run_stop_loss(self, market_id: str, current_bid: float, current_ask: float):
+        """Read the market's stop loss file and send any triggered stop loss order (see _check_stop_loss)."""
         try:
             # Path to stop loss file
             stoploss_dir = os.path.join(project_root, "Stoploss")
             stoploss_file = os.path.join(stoploss_dir, f"{market_id}.json")
             
             # Check if stop loss file exists
-            if not os.path.exists(stoploss_file):
+            try:
+                mtime = os.stat(stoploss_file).st_mtime_ns
+            except FileNotFoundError:
+                return
+            
+            # A repeated quote against an unchanged file would reach the same decision, skip re-reading it
+            check_key = (current_bid, current_ask, mtime)
+            if self._stop_loss_checked.get(market_id) == check_key:
                 return
             
             # Read stop loss data
-            with open(stoploss_file, 'r') as f:
-                stoploss_data = json.load(f)
+            stoploss_data = read_stoploss(stoploss_file)
             
             # Check if stop loss is still active
             if not stoploss_data.get('active', True):
+                self._stop_loss_checked[market_id] = check_key
                 return
             
             buy_stop_loss_price = stoploss_data.get('buy_stop_loss_price')
@@ -531,15 +578,19 @@ class KalshiWebSocketHandler:
             contracts = stoploss_data.get('contracts', 1)
             
             if buy_stop_loss_price is None or sell_stop_loss_price is None:
+                self._stop_loss_checked[market_id] = check_key
                 return
             
+            triggered = False
             # Check if ask price exceeds buy stop loss trigger
             # Buy stop loss: if ask > (original_sell_price + stop_loss), buy to cover
             original_sell_price = stoploss_data.get('sell_price_cents')
             if original_sell_price and current_ask > original_sell_price + stoploss_data.get('stop_loss_cents', 0):
                 # Trigger buy stop loss
+                triggered = True
                 try:
-                    buy_order = self.api_client.create_order(
+                    buy_order = await asyncio.to_thread(
+                        self.api_client.create_order,
                         ticker=market_id,
                         side="yes",
                         action="buy",
@@ -552,8 +603,7 @@ class KalshiWebSocketHandler:
                         stoploss_data['active'] = False
                         stoploss_data['buy_stop_loss_executed'] = True
                         stoploss_data['buy_stop_loss_executed_at'] = datetime.now().isoformat()
-                        with open(stoploss_file, 'w') as f:
-                            json.dump(stoploss_data, f, indent=2)
+                        write_stoploss(stoploss_file, stoploss_data)
                 except Exception as e:
                     self.add_log('error', f'Error executing buy stop loss for {market_id}: {e}')
             
@@ -562,8 +612,10 @@ class KalshiWebSocketHandler:
             original_buy_price = stoploss_data.get('buy_price_cents')
             if original_buy_price and current_bid < original_buy_price - stoploss_data.get('stop_loss_cents', 0):
                 # Trigger sell stop loss
+                triggered = True
                 try:
-                    sell_order = self.api_client.create_order(
+                    sell_order = await asyncio.to_thread(
+                        self.api_client.create_order,
                         ticker=market_id,
                         side="yes",
                         action="sell",
@@ -576,10 +628,13 @@ class KalshiWebSocketHandler:
                         stoploss_data['active'] = False
                         stoploss_data['sell_stop_loss_executed'] = True
                         stoploss_data['sell_stop_loss_executed_at'] = datetime.now().isoformat()
-                        with open(stoploss_file, 'w') as f:
-                            json.dump(stoploss_data, f, indent=2)
+                        write_stoploss(stoploss_file, stoploss_data)
                 except Exception as e:
                     self.add_log('error', f'Error executing sell stop loss for {market_id}: {e}')
+            
+            # Quotes that sent an order (or failed to) are never skipped, so a failed order is retried
+            if not triggered:
+                self._stop_loss_checked[market_id] = check_key
                     
         except Exception as e:
             # Don't log errors for missing files, but log other errors
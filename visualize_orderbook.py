@@ -6,9 +6,9 @@ Visualize orderbook data for price movement analysis and market making opportuni
 Loads orderbook snapshots saved by orderBookListener.py and creates visualizations.
 
 Usage:
-    python visualize_orderbook.py <orderbook_file.json>
+    python visualize_orderbook.py <orderbook_file.jsonl>
     python visualize_orderbook.py --list  # List available orderbook files
-    python visualize_orderbook.py data/orderbookData/orderBook_KXBTC-25JAN03.json -o plots/
+    python visualize_orderbook.py data/orderbookData/orderBook_KXBTC-25JAN03.jsonl -o plots/
 """
 
 import json
@@ -20,6 +20,11 @@ from datetime import datetime
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 
+from Getdata.snapshotFiles import iter_snapshots
+
+# Snapshot files written by the orderbook listener (plain, zstd or gzip compressed JSONL)
+SNAPSHOT_EXTENSIONS = ('.json', '.jsonl', '.jsonl.zst', '.jsonl.gz')
+
 
 def has_interactive_backend():
     """Check if matplotlib has an interactive backend available."""
@@ -119,15 +124,18 @@ def simulate_market_making(mid_prices: List[float], bids: List[float], asks: Lis
 
 
 def load_orderbook_data(filepath: str) -> List[Dict]:
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Load snapshots from a .jsonl file (one per line, optionally .zst/.gz compressed) or a legacy JSON array file."""
+    if filepath.endswith('.json'):
+        with open(filepath, 'r') as f:
+            return json.load(f)
+    return list(iter_snapshots(filepath))
 
 
 def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
     """Main function to visualize orderbook data.
     
     Args:
-        filepath: Path to orderbook JSON file. If None, uses CLI args or shows usage.
+        filepath: Path to orderbook JSONL (or legacy JSON) file. If None, uses CLI args or shows usage.
         output_dir: Directory to save visualization. Defaults to same directory as input.
     """
     import argparse
@@ -135,7 +143,7 @@ def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
     # Parse CLI args if not called programmatically
     if filepath is None:
         parser = argparse.ArgumentParser(description='Visualize orderbook data for price movement analysis.')
-        parser.add_argument('filepath', nargs='?', help='Path to orderbook JSON file')
+        parser.add_argument('filepath', nargs='?', help='Path to orderbook JSONL (or legacy JSON) file')
         parser.add_argument('--output', '-o', help='Output directory for visualization (default: same as input)')
         parser.add_argument('--list', '-l', action='store_true', help='List available orderbook files')
         args = parser.parse_args()
@@ -146,7 +154,7 @@ def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
         
         if args.list:
             if os.path.exists(orderbook_dir):
-                files = [f for f in os.listdir(orderbook_dir) if f.endswith('.json')]
+                files = [f for f in os.listdir(orderbook_dir) if f.endswith(SNAPSHOT_EXTENSIONS)]
                 if files:
                     print(f"Available orderbook files in {orderbook_dir}:")
                     for f in sorted(files):
@@ -158,9 +166,9 @@ def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
             return
         
         if not args.filepath:
-            print("Usage: python visualize_orderbook.py <orderbook_file.json>")
+            print("Usage: python visualize_orderbook.py <orderbook_file.jsonl>")
             print("       python visualize_orderbook.py --list  # List available files")
-            print("\nExample: python visualize_orderbook.py data/orderbookData/orderBook_KXBTC-25JAN03.json")
+            print("\nExample: python visualize_orderbook.py data/orderbookData/orderBook_KXBTC-25JAN03.jsonl")
             return
         
         filepath = args.filepath
@@ -182,7 +190,10 @@ def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
     timestamps, mid_prices, best_bids, best_asks, spreads = [], [], [], [], []
     
     for entry in data:
-        ts = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
+        if 'ts_ns' in entry:
+            ts = datetime.fromtimestamp(entry['ts_ns'] / 1e9)
+        else:
+            ts = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
         timestamps.append(ts)
         bid, ask = get_best_bid_ask(entry.get('order_book', {}))
         best_bids.append(bid)
@@ -242,7 +253,7 @@ def main(filepath: Optional[str] = None, output_dir: Optional[str] = None):
         output_dir = os.path.dirname(filepath)
     os.makedirs(output_dir, exist_ok=True)
     
-    base_name = os.path.splitext(os.path.basename(filepath))[0]
+    base_name = os.path.basename(filepath).split('.json')[0]
     output_path = os.path.join(output_dir, f"{base_name}_visualization.png")
     
     plt.savefig(output_path, dpi=300, bbox_inches='tight')